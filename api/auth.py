@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from . import metrics
+
+# --- TOKENS AND PASSWORD HASHING ---
+# Requests carry the JWT issued by /api/login; its claims (username, user id, admin flag)
+# identify the caller, so a location ping never needs a users-table lookup. Decoded claims
+# are cached per token until the token expires or `cache_ttl` runs out.
+JWT_ALGORITHM = "HS256"
+BCRYPT_THREADS = int(os.getenv("BCRYPT_THREADS", str(min(4, os.cpu_count() or 1))))
+
+
+@dataclass(frozen=True)
+class Claims:
+    username: str
+    user_id: Optional[int]
+    is_admin: bool
+    expires_at: float
+
+
+class TTLCache:
+    """Small thread-safe LRU whose entries also expire."""
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key, now: Optional[float] = None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return None
+            expires_at, value = entry
+            if (now or time.time()) >= expires_at:
+                del self._entries[key]
+                return None
+            return value
+
+    def put(self, key, value, expires_at: Optional[float] = None, now: Optional[float] = None):
+        deadline = (now or time.time()) + self.ttl
+        with self._lock:
+            self._entries[key] = (min(deadline, expires_at) if expires_at else deadline, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock: self._entries.pop(key, None)
+
+
+class TokenVerifier:
+    def __init__(self, secret: str, lifetime: timedelta = timedelta(hours=24), cache_ttl: float = 300.0, max_entries: int = 4096):
+        self.secret = secret
+        self.lifetime = lifetime
+        self._cache = TTLCache(max_entries, cache_ttl)
+
+    def issue(self, username: str, user_id: int, is_admin: bool) -> str:
+        from jose import jwt
+        claims = {"sub": username, "uid": user_id, "is_admin": is_admin, "exp": datetime.utcnow() + self.lifetime}
+        return jwt.encode(claims, self.secret, algorithm=JWT_ALGORITHM)
+
+    def verify(self, token: str) -> Optional[Claims]:
+        """Claims of a valid, unexpired token; None for anything else."""
+        cached = self._cache.get(token)
+        metrics.cache_requests.inc(cache="jwt", result="miss" if cached is None else "hit")
+        if cached is not None: return cached
+        from jose import JWTError, jwt
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=[JWT_ALGORITHM])
+        except JWTError:
+            return None
+        if not payload.get("sub"): return None
+        # Tokens issued before the uid claim existed resolve their id from the DB instead
+        claims = Claims(payload["sub"], payload.get("uid"), bool(payload.get("is_admin")), float(payload.get("exp") or 0))
+        self._cache.put(token, claims, expires_at=claims.expires_at or None)
+        return claims
+
+
+class PasswordHasher:
+    """
+    bcrypt on a small dedicated thread pool, so a burst of logins queues here instead of
+    blocking the event loop or taking every thread from the shared sync-route pool.
+    """
+
+    def __init__(self, context: Callable, max_workers: int = BCRYPT_THREADS):
+        self.context = context
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context().hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """(valid, new_hash); new_hash is set when the stored hash's cost differs from the configured rounds."""
+        if not hashed: return False, None
+        return await self._run(self.context().verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None: self._executor.shutdown(wait=False)
@@ -1,15 +1,85 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, Boolean, DateTime, Time, text
+from sqlalchemy import create_engine, make_url, Column, Integer, String, Float, Text, Boolean, DateTime, Time, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from passlib.context import CryptContext
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 from datetime import datetime
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./test.db") 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# --- CONNECTION POOLING ---
+# DB_POOL_MODE=null opens a connection per checkout and never keeps one idle, which is what
+# serverless functions want (and what PgBouncer in transaction mode expects). Otherwise each
+# process keeps a QueuePool of DB_POOL_SIZE connections plus DB_MAX_OVERFLOW extra under load.
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "queue")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+# Set when connecting through PgBouncer (transaction pooling): no server-side prepared statements
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "").lower() in ("1", "true", "yes")
+
+def pool_options(url: str) -> dict:
+    if DB_POOL_MODE == "null": return {"poolclass": NullPool}
+    # SQLite picks its own pool class; the sizing knobs only apply to server databases
+    if url.startswith("sqlite"): return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT, "pool_recycle": DB_POOL_RECYCLE}
+
+# The engine (and with it the DBAPI driver import) is built on first use, not at import time
+_engine = None
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_engine(DATABASE_URL, pool_pre_ping=True, **pool_options(DATABASE_URL))
+    return _engine
+
+class LazyBindSession(Session):
+    def get_bind(self, mapper=None, **kw):
+        if self.bind is None: self.bind = get_engine()
+        return super().get_bind(mapper, **kw)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, class_=LazyBindSession)
+
+def async_database_url(url: str) -> str:
+    """Same database through an asyncio driver: asyncpg for Postgres, aiosqlite for SQLite."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite": return url.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    query = dict(url.query)
+    # libpq-only options asyncpg does not understand (e.g. in Neon / Vercel Postgres URLs)
+    if "sslmode" in query: query["ssl"] = query.pop("sslmode")
+    query.pop("channel_binding", None)
+    if DB_PGBOUNCER: query["prepared_statement_cache_size"] = "0"
+    return url.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+_async_engine = None
+
+def get_async_engine():
+    # Created on first use so the sync-only entry points never import an async driver
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = async_database_url(DATABASE_URL)
+        connect_args = {"statement_cache_size": 0} if DB_PGBOUNCER and "asyncpg" in url else {}
+        _async_engine = create_async_engine(url, pool_pre_ping=True, connect_args=connect_args, **pool_options(url))
+    return _async_engine
+
+def AsyncSessionLocal():
+    from sqlalchemy.ext.asyncio import AsyncSession
+    return AsyncSession(get_async_engine(), autoflush=False, expire_on_commit=False)
 Base = declarative_base()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost: lowering it trades hash strength for CPU per login. Hashes stored with any
+# other cost verify as usual and are re-hashed at BCRYPT_ROUNDS on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS,
+                                    bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS)
+    return _pwd_context
 
 class User(Base):
     __tablename__ = "users"
@@ -31,6 +101,9 @@ class Place(Base):
     lat = Column(Float, nullable=True)
     lng = Column(Float, nullable=True)
 
+    # Bounding-box scans for the nearby-places fallback
+    __table_args__ = (Index("ix_places_lat_lng", "lat", "lng"),)
+
 class SafeZone(Base):
     __tablename__ = "safe_zones"
     id = Column(Integer, primary_key=True, index=True)
@@ -45,40 +118,39 @@ class SafeZone(Base):
     active_to = Column(Time, nullable=True)
     
     # Crowdsourcing Logic
-    expires_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
     source = Column(String, default="Admin") 
 
+    # Set on AI-generated zones so a re-analysis can replace its own earlier output
+    place_id = Column(Integer, nullable=True, index=True)
+
 class IncidentReport(Base):
     __tablename__ = "incident_reports"
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String)
     lat = Column(Float)
     lng = Column(Float)
-    reported_at = Column(DateTime, default=datetime.utcnow)
-
-
-# --- AUTOMATIC SCHEMA MIGRATION LOGIC ---
-# This forces PostgreSQL to add the missing columns to existing tables
-def migrate_schema():
-    with engine.connect() as conn:
-        try:
-            # Fixes for the Places table
-            conn.execute(text("ALTER TABLE places ADD COLUMN IF NOT EXISTS lat FLOAT;"))
-            conn.execute(text("ALTER TABLE places ADD COLUMN IF NOT EXISTS lng FLOAT;"))
-            
-            # Fixes for the SafeZones table (THIS FIXES YOUR VERCEL ERROR)
-            conn.execute(text("ALTER TABLE safe_zones ADD COLUMN IF NOT EXISTS active_from TIME;"))
-            conn.execute(text("ALTER TABLE safe_zones ADD COLUMN IF NOT EXISTS active_to TIME;"))
-            conn.execute(text("ALTER TABLE safe_zones ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;"))
-            conn.execute(text("ALTER TABLE safe_zones ADD COLUMN IF NOT EXISTS source VARCHAR DEFAULT 'Admin';"))
-            
-            conn.commit()
-            print("Database migration successful. All new columns added.")
-        except Exception as e:
-            print(f"Migration error (this is okay if using SQLite locally): {e}")
-
-# 1. Run the column adder
-
-
-# 2. Create tables if they don't exist at all (like the new incident_reports table)
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    reported_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class TrackHour(Base):
+    # One user's downsampled location history for one hour (see api/history.py for the encoding)
+    __tablename__ = "track_hours"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    hour = Column(Integer, nullable=False)  # unix time // 3600
+    samples = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    # Bounding box of the samples, so "who was near X" can skip most rows in SQL
+    min_lat = Column(Float)
+    max_lat = Column(Float)
+    min_lng = Column(Float)
+    max_lng = Column(Float)
+
+    __table_args__ = (
+        Index("ix_track_hours_user_hour", "user_id", "hour", unique=True),
+        Index("ix_track_hours_hour", "hour"),
+    )
+
+
+# Schema changes live in api/migrations.py and run as a deploy step (`python -m api.migrations`),
+# so importing this module never touches the database.
@@ -0,0 +1,54 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+
+# --- SERVER PUSH (Redis pub/sub -> Server-Sent Events) ---
+# Every instance publishes zone and tourist changes to one channel; each open SSE
+# connection subscribes to it, so a change made by any instance reaches every console.
+EVENTS_CHANNEL = "events"
+TOPICS = {"zones": "zone.", "tourists": "tourist."}
+HEARTBEAT_SECONDS = 15
+
+
+def event_message(kind: str, data) -> str:
+    return json.dumps({"type": kind, "data": data, "ts": time.time()}, default=str)
+
+
+def publish(r, kind: str, data):
+    r.publish(EVENTS_CHANNEL, event_message(kind, data))
+
+
+def pipeline_publish(pipe, kind: str, data):
+    pipe.publish(EVENTS_CHANNEL, event_message(kind, data))
+
+
+def zone_payload(zone) -> dict:
+    return {
+        "id": zone.id, "name": zone.name, "lat": zone.lat, "lng": zone.lng, "radius": zone.radius,
+        "category": zone.category, "active_from": zone.active_from, "active_to": zone.active_to,
+        "expires_at": zone.expires_at, "source": zone.source
+    }
+
+
+async def sse_stream(async_redis, topics: Optional[set[str]] = None) -> AsyncIterator[str]:
+    prefixes = tuple(TOPICS[t] for t in topics) if topics else tuple(TOPICS.values())
+    pubsub = async_redis.pubsub()
+    await pubsub.subscribe(EVENTS_CHANNEL)
+    try:
+        yield "retry: 3000\n\n"
+        last_beat = time.monotonic()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message and message.get("type") == "message":
+                raw = message["data"]
+                event = json.loads(raw)
+                if event["type"].startswith(prefixes):
+                    yield f"event: {event['type']}\ndata: {raw}\n\n"
+            if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+                last_beat = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(0)
+    finally:
+        await pubsub.unsubscribe(EVENTS_CHANNEL)
+        await pubsub.aclose()
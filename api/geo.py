@@ -0,0 +1,330 @@
+import hashlib
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone, time as dt_time
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEG = 111195  # great-circle metres per degree of latitude
+
+
+# --- HAVERSINE DISTANCES ---
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Scalar haversine distance in metres."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    h = math.sin((p2 - p1) / 2)**2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2)**2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+def haversine_m(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Element-wise haversine distance in metres; arguments broadcast like NumPy arrays."""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dl = np.radians(np.asarray(lng2) - np.asarray(lng1))
+    h = np.sin((p2 - p1) / 2)**2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2)**2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def pairwise_haversine_m(lats_a, lngs_a, lats_b, lngs_b) -> np.ndarray:
+    """N x M distance matrix between point sets A and B."""
+    lats_a, lngs_a = np.asarray(lats_a, dtype=float)[:, None], np.asarray(lngs_a, dtype=float)[:, None]
+    lats_b, lngs_b = np.asarray(lats_b, dtype=float)[None, :], np.asarray(lngs_b, dtype=float)[None, :]
+    return haversine_m(lats_a, lngs_a, lats_b, lngs_b)
+
+
+def bounding_box(lat: float, lng: float, radius_m: float) -> tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) enclosing a circle; suitable for an indexed range scan."""
+    lat_span = radius_m / METERS_PER_DEG
+    lng_span = lat_span / max(math.cos(math.radians(min(abs(lat) + lat_span, 89.0))), 1e-6)
+    return lat - lat_span, lng - min(lng_span, 180.0), lat + lat_span, lng + min(lng_span, 180.0)
+
+
+# --- GEOHASH ---
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 6) -> str:
+    lat_rng, lng_rng = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, val = (lng_rng, lng) if even else (lat_rng, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if val >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch <<= 1
+            rng[1] = mid
+        even, bits = not even, bits + 1
+        if bits == 5:
+            chars.append(_GEOHASH_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash: str) -> tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) of a geohash cell."""
+    lat_rng, lng_rng = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for c in geohash:
+        cd = _GEOHASH_BASE32.index(c)
+        for shift in range(4, -1, -1):
+            rng = lng_rng if even else lat_rng
+            mid = (rng[0] + rng[1]) / 2
+            if (cd >> shift) & 1: rng[0] = mid
+            else: rng[1] = mid
+            even = not even
+    return lat_rng[0], lng_rng[0], lat_rng[1], lng_rng[1]
+
+
+def geohash_center(geohash: str) -> tuple[float, float]:
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+class PointSet:
+    """
+    Immutable coordinate arrays (plus optional per-point radius and payload) for
+    batched within-radius and k-nearest queries.
+    """
+
+    def __init__(self, lats: Sequence[float], lngs: Sequence[float], radii: Optional[Sequence[float]] = None, items: Optional[Sequence] = None):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.radii = None if radii is None else np.asarray(radii, dtype=float)
+        self.items = list(items) if items is not None else list(range(len(self.lats)))
+
+    @classmethod
+    def from_objects(cls, objs, radius_attr: Optional[str] = None) -> "PointSet":
+        objs = [o for o in objs if getattr(o, "lat", None) is not None and getattr(o, "lng", None) is not None]
+        radii = [getattr(o, radius_attr) for o in objs] if radius_attr else None
+        return cls([o.lat for o in objs], [o.lng for o in objs], radii, objs)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def distances(self, lat: float, lng: float) -> np.ndarray:
+        return haversine_m(lat, lng, self.lats, self.lngs)
+
+    def distance_matrix(self, lats, lngs) -> np.ndarray:
+        return pairwise_haversine_m(lats, lngs, self.lats, self.lngs)
+
+    def count_within(self, lat: float, lng: float, radius_m: float) -> int:
+        if not len(self): return 0
+        return int(np.count_nonzero(self.distances(lat, lng) <= radius_m))
+
+    def within(self, lat: float, lng: float, radius_m: float) -> list:
+        if not len(self): return []
+        return [self.items[i] for i in np.flatnonzero(self.distances(lat, lng) <= radius_m)]
+
+    def nearest(self, lat: float, lng: float, k: int) -> list[tuple[object, float]]:
+        if not len(self) or k <= 0: return []
+        d = self.distances(lat, lng)
+        k = min(k, len(d))
+        idx = np.argpartition(d, k - 1)[:k]
+        idx = idx[np.argsort(d[idx], kind="stable")]
+        return [(self.items[i], float(d[i])) for i in idx]
+
+    def containing(self, lats, lngs) -> np.ndarray:
+        """N x M mask: point n lies inside circle m (requires radii)."""
+        if not len(self): return np.zeros((len(lats), 0), dtype=bool)
+        return self.distance_matrix(lats, lngs) <= self.radii[None, :]
+
+
+# --- SPATIAL INDEX FOR SAFE ZONES ---
+# Zones are bucketed into a fixed lat/lng grid. A zone circle is registered in every
+# cell its bounding box touches, so a point lookup only has to look at one cell.
+CELL_DEG = 0.01  # ~1.1 km per cell
+VECTORIZE_MIN_PAIRS = 64
+
+
+@dataclass(frozen=True)
+class ZoneEntry:
+    id: int
+    name: str
+    lat: float
+    lng: float
+    radius: float
+    category: str
+    active_from: Optional[dt_time] = None
+    active_to: Optional[dt_time] = None
+    expires_at: Optional[datetime] = None
+    source: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, zone) -> "ZoneEntry":
+        return cls(zone.id, zone.name, zone.lat, zone.lng, zone.radius, zone.category,
+                   zone.active_from, zone.active_to, zone.expires_at, zone.source)
+
+
+# Windows are inclusive (`from <= t <= to`, `now > expires_at`), so a zone only changes
+# state just *after* its end time; boundaries are nudged by this much past it.
+BOUNDARY_EPS = timedelta(microseconds=1)
+
+
+class ZoneIndex:
+    """
+    Process-local grid index over safe-zone circles.
+    Patched in place when this process creates or deletes zones. Changes made by other
+    instances are noticed through a shared version number (`check_version`), and the index
+    is fully rebuilt from the DB every `max_age` seconds in case that version is unavailable.
+
+    The set of currently active zones is materialized once and reused until the next
+    time any zone can change state (an `active_from`/`active_to` time of day in `tz`,
+    or an `expires_at`), so hot paths never evaluate time windows per row.
+    """
+
+    def __init__(self, cell_deg: float = CELL_DEG, max_age: float = 30.0, on_expired: Optional[Callable] = None,
+                 is_active: Optional[Callable[[ZoneEntry, datetime, dt_time], bool]] = None, tz=timezone.utc):
+        self.cell_deg = cell_deg
+        self.max_age = max_age
+        self.on_expired = on_expired
+        self.is_active = is_active or (lambda zone, now_utc, local_time: True)
+        self.tz = tz
+        self._lock = threading.RLock()
+        self._zones: dict[int, ZoneEntry] = {}
+        self._cells: dict[tuple[int, int], set[int]] = {}
+        self._built_at: Optional[float] = None
+        self._version: Optional[int] = None
+        self._active: Optional[list[ZoneEntry]] = None
+        self._active_ids: set[int] = set()
+        self._active_digest = ""
+        self._active_until: Optional[datetime] = None
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def _cells_for(self, zone: ZoneEntry):
+        lat_span = zone.radius / METERS_PER_DEG
+        lng_span = lat_span / max(math.cos(math.radians(min(abs(zone.lat) + lat_span, 89.0))), 1e-6)
+        lat0, lng0 = self._cell(zone.lat - lat_span, zone.lng - lng_span)
+        lat1, lng1 = self._cell(zone.lat + lat_span, zone.lng + lng_span)
+        for i in range(lat0, lat1 + 1):
+            for j in range(lng0, lng1 + 1):
+                yield (i, j)
+
+    def _insert(self, zone: ZoneEntry):
+        self._active = None
+        self._zones[zone.id] = zone
+        for cell in self._cells_for(zone):
+            self._cells.setdefault(cell, set()).add(zone.id)
+
+    def _discard(self, zone_id: int):
+        zone = self._zones.pop(zone_id, None)
+        if zone is None: return
+        self._active = None
+        for cell in self._cells_for(zone):
+            bucket = self._cells.get(cell)
+            if bucket is None: continue
+            bucket.discard(zone_id)
+            if not bucket: del self._cells[cell]
+
+    def rebuild(self, zones, version: Optional[int] = None):
+        """`version` is the shared zone version read *before* the zones were loaded."""
+        now_utc = datetime.utcnow()
+        with self._lock:
+            previous = self._zones
+            self._zones, self._cells, self._active = {}, {}, None
+            for z in zones:
+                entry = z if isinstance(z, ZoneEntry) else ZoneEntry.from_model(z)
+                if entry.expires_at and entry.expires_at < now_utc: continue
+                self._insert(entry)
+            self._built_at = time.monotonic()
+            self._version = version
+        expired = [z for i, z in previous.items() if i not in self._zones and z.expires_at and z.expires_at < now_utc]
+        if expired and self.on_expired: self.on_expired(expired)
+
+    def is_stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def check_version(self, version: Optional[int]):
+        """Marks the index stale if the shared version moved since the last rebuild (None: unknown, keep the TTL)."""
+        if version is None: return
+        with self._lock:
+            if version != self._version: self._built_at = None
+
+    def note_version(self, version: Optional[int]):
+        """After this process bumped the shared version for a change it already patched in, skip the rebuild."""
+        if version is None: return
+        with self._lock:
+            if self._version is not None and version == self._version + 1: self._version = version
+
+    def ensure_fresh(self, db, version: Optional[int] = None):
+        if not self.is_stale(): return
+        from .database import SafeZone
+        now_utc = datetime.utcnow()
+        self.rebuild(db.query(SafeZone).filter((SafeZone.expires_at == None) | (SafeZone.expires_at >= now_utc)).all(), version)  # noqa: E711
+
+    def add(self, zone):
+        entry = zone if isinstance(zone, ZoneEntry) else ZoneEntry.from_model(zone)
+        with self._lock:
+            self._discard(entry.id)
+            self._insert(entry)
+
+    def remove(self, zone_id: int):
+        with self._lock:
+            self._discard(zone_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def containing(self, lat: float, lng: float) -> list[ZoneEntry]:
+        """Zones whose circle contains the point, in id order (same order as a table scan)."""
+        return self.containing_many([(lat, lng)])[0]
+
+    def containing_many(self, points: Sequence[tuple[float, float]], active_only: bool = False, now_utc: Optional[datetime] = None) -> list[list[ZoneEntry]]:
+        """Batched `containing`: one distance matrix over the union of the points' grid cells."""
+        if not points: return []
+        with self._lock:
+            ids = set()
+            for lat, lng in points: ids.update(self._cells.get(self._cell(lat, lng), ()))
+            if active_only:
+                self._materialize(now_utc or datetime.utcnow())
+                ids &= self._active_ids
+            candidates = sorted((self._zones[i] for i in ids), key=lambda z: z.id)
+        if not candidates: return [[] for _ in points]
+        if len(points) * len(candidates) < VECTORIZE_MIN_PAIRS:
+            # NumPy call overhead dominates for a handful of pairs
+            return [[z for z in candidates if distance_m(lat, lng, z.lat, z.lng) <= z.radius] for lat, lng in points]
+        mask = PointSet.from_objects(candidates, "radius").containing([p[0] for p in points], [p[1] for p in points])
+        return [[candidates[j] for j in np.flatnonzero(row)] for row in mask]
+
+    def active(self, now_utc: Optional[datetime] = None) -> tuple[list[ZoneEntry], str]:
+        """Currently active zones in id order, plus a digest of the set (usable as an ETag)."""
+        with self._lock:
+            self._materialize(now_utc or datetime.utcnow())
+            return self._active, self._active_digest
+
+    def active_until(self) -> Optional[datetime]:
+        return self._active_until if self._active is not None else None
+
+    def _materialize(self, now_utc: datetime):
+        if self._active is not None and now_utc < self._active_until: return
+        local_now = now_utc.replace(tzinfo=timezone.utc).astimezone(self.tz)
+        local_time = local_now.time().replace(tzinfo=None)
+        active = sorted((z for z in self._zones.values() if self.is_active(z, now_utc, local_time)), key=lambda z: z.id)
+        self._active = active
+        self._active_ids = {z.id for z in active}
+        self._active_digest = hashlib.sha1(repr(active).encode()).hexdigest()
+        self._active_until = self._next_boundary(now_utc, local_now)
+
+    def _next_boundary(self, now_utc: datetime, local_now: datetime) -> datetime:
+        boundaries = [now_utc + timedelta(hours=1)]
+        times = set()
+        for z in self._zones.values():
+            if z.expires_at and z.expires_at >= now_utc: boundaries.append(z.expires_at + BOUNDARY_EPS)
+            if z.active_from and z.active_to:
+                times.add((z.active_from, timedelta(0)))
+                times.add((z.active_to, BOUNDARY_EPS))
+        for t, eps in times:
+            local = local_now.replace(hour=t.hour, minute=t.minute, second=t.second, microsecond=t.microsecond) + eps
+            if local <= local_now: local += timedelta(days=1)
+            boundaries.append(local.astimezone(timezone.utc).replace(tzinfo=None))
+        return min(boundaries)
+
+    def __len__(self):
+        return len(self._zones)
@@ -0,0 +1,194 @@
+import struct
+import time
+from collections import defaultdict
+from typing import Callable, Optional
+
+import numpy as np
+
+from .geo import bounding_box, haversine_m
+
+# --- LOCATION HISTORY (append-only, fixed-width binary samples) ---
+# Every ping becomes one 10-byte sample: seconds into the hour (uint16) and lat/lng in
+# microdegrees (int32, ~0.1 m). Recent hours live in Redis as one APPENDed string per user
+# per hour (`hist:{user_id}:{hour}`) plus a set of the users seen that hour; `compact`
+# later downsamples each finished user-hour into a single TrackHour row.
+SAMPLE = struct.Struct("<Hii")
+SAMPLE_DTYPE = np.dtype([("offset", "<u2"), ("lat", "<i4"), ("lng", "<i4")])
+MICRODEG = 1_000_000
+HOUR = 3600
+
+HISTORY_KEY = "hist:{}:{}"
+HISTORY_USERS_KEY = "hist:users:{}"
+COMPACTED_KEY = "hist:compacted"
+
+
+def encode_sample(ts: float, lat: float, lng: float) -> bytes:
+    return SAMPLE.pack(int(ts) % HOUR, round(lat * MICRODEG), round(lng * MICRODEG))
+
+
+def decode_samples(blob: bytes, hour: int) -> np.ndarray:
+    """(N, 3) array of [unix_ts, lat, lng] from one user-hour's samples."""
+    raw = np.frombuffer(blob, dtype=SAMPLE_DTYPE, count=len(blob) // SAMPLE.size)
+    out = np.empty((len(raw), 3))
+    out[:, 0] = hour * HOUR + raw["offset"].astype(np.int64)
+    out[:, 1] = raw["lat"] / MICRODEG
+    out[:, 2] = raw["lng"] / MICRODEG
+    return out
+
+
+def downsample(samples: np.ndarray, hour: int, every: int) -> bytes:
+    """Keeps the last sample of each `every`-second bucket, re-encoded in time order."""
+    if not len(samples): return b""
+    samples = samples[np.argsort(samples[:, 0], kind="stable")]
+    buckets = (samples[:, 0] - hour * HOUR) // every
+    last = np.r_[buckets[1:] != buckets[:-1], True]
+    kept = samples[last]
+    packed = np.empty(len(kept), dtype=SAMPLE_DTYPE)
+    packed["offset"] = kept[:, 0] - hour * HOUR
+    packed["lat"] = np.round(kept[:, 1] * MICRODEG)
+    packed["lng"] = np.round(kept[:, 2] * MICRODEG)
+    return packed.tobytes()
+
+
+class LocationHistory:
+    """
+    `redis` is the normal client (writes, sets, locks); `raw_redis` must not decode replies,
+    since the samples are binary. Raw samples stay in Redis for `raw_hours`, then live on in
+    the DB at one sample per `downsample_seconds` for `retention_days`.
+    """
+
+    def __init__(self, redis: Callable, raw_redis: Callable, raw_hours: int = 2, downsample_seconds: int = 30,
+                 retention_days: int = 30, grace_hours: int = 6):
+        self.redis = redis
+        self.raw_redis = raw_redis
+        self.raw_hours = raw_hours
+        self.downsample_seconds = downsample_seconds
+        self.retention_days = retention_days
+        # Redis keys outlive `raw_hours` by this much, so a late compaction run loses nothing
+        self.key_ttl = (raw_hours + grace_hours) * HOUR
+
+    # --- writes ---
+    def queue_append(self, pipe, positions: dict[int, tuple[float, float]], now: Optional[float] = None):
+        """Adds the commands for one sample per user to an existing pipeline."""
+        if not positions: return
+        now = now or time.time()
+        hour = int(now) // HOUR
+        for user_id, (lat, lng) in positions.items():
+            key = HISTORY_KEY.format(user_id, hour)
+            pipe.append(key, encode_sample(now, lat, lng))
+            pipe.expire(key, self.key_ttl)
+        users_key = HISTORY_USERS_KEY.format(hour)
+        pipe.sadd(users_key, *positions)
+        pipe.expire(users_key, self.key_ttl)
+
+    def append(self, positions: dict[int, tuple[float, float]], now: Optional[float] = None):
+        if not positions: return
+        pipe = self.redis().pipeline(transaction=False)
+        self.queue_append(pipe, positions, now)
+        pipe.execute()
+
+    # --- reads ---
+    def _hours(self, start: float, end: float) -> range:
+        return range(int(start) // HOUR, int(end) // HOUR + 1)
+
+    def _redis_blobs(self, keys: list[tuple[int, int]]) -> dict[tuple[int, int], bytes]:
+        if not keys: return {}
+        pipe = self.raw_redis().pipeline(transaction=False)
+        for user_id, hour in keys: pipe.get(HISTORY_KEY.format(user_id, hour))
+        return {key: blob for key, blob in zip(keys, pipe.execute()) if blob}
+
+    def _samples(self, blobs: dict[tuple[int, int], bytes], rows) -> dict[int, np.ndarray]:
+        """Per-user samples from Redis blobs and DB rows; an hour present in both is deduplicated."""
+        parts = defaultdict(list)
+        for (user_id, hour), blob in blobs.items(): parts[user_id].append(decode_samples(blob, hour))
+        for row in rows: parts[row.user_id].append(decode_samples(row.samples, row.hour))
+        merged = {}
+        for user_id, chunks in parts.items():
+            samples = np.unique(np.concatenate(chunks), axis=0) if len(chunks) > 1 else chunks[0]
+            merged[user_id] = samples[np.argsort(samples[:, 0], kind="stable")]
+        return merged
+
+    def track(self, db, user_id: int, start: float, end: float) -> list[tuple[float, float, float]]:
+        """(unix_ts, lat, lng) samples of one user between `start` and `end`, oldest first."""
+        from .database import TrackHour
+        hours = self._hours(start, end)
+        blobs = self._redis_blobs([(user_id, hour) for hour in hours])
+        rows = db.query(TrackHour).filter(TrackHour.user_id == user_id, TrackHour.hour.between(hours.start, hours.stop - 1)).all()
+        samples = self._samples(blobs, rows).get(user_id)
+        if samples is None: return []
+        samples = samples[(samples[:, 0] >= start) & (samples[:, 0] <= end)]
+        return [(float(t), float(lat), float(lng)) for t, lat, lng in samples]
+
+    def near(self, db, lat: float, lng: float, radius_m: float, start: float, end: float) -> list[dict]:
+        """Users with at least one sample within `radius_m` of the point between `start` and `end`, closest first."""
+        from .database import TrackHour
+        hours = self._hours(start, end)
+        pipe = self.redis().pipeline(transaction=False)
+        for hour in hours: pipe.smembers(HISTORY_USERS_KEY.format(hour))
+        blobs = self._redis_blobs([(int(user_id), hour) for hour, users in zip(hours, pipe.execute()) for user_id in users])
+        # Compacted hours are pre-filtered in SQL by each row's bounding box
+        min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_m)
+        rows = db.query(TrackHour).filter(
+            TrackHour.hour.between(hours.start, hours.stop - 1),
+            TrackHour.max_lat >= min_lat, TrackHour.min_lat <= max_lat,
+            TrackHour.max_lng >= min_lng, TrackHour.min_lng <= max_lng
+        ).all()
+
+        hits = []
+        for user_id, samples in self._samples(blobs, rows).items():
+            samples = samples[(samples[:, 0] >= start) & (samples[:, 0] <= end)]
+            if not len(samples): continue
+            dists = haversine_m(lat, lng, samples[:, 1], samples[:, 2])
+            inside = dists <= radius_m
+            if not inside.any(): continue
+            times = samples[inside, 0]
+            hits.append({"user_id": user_id, "first_seen": float(times.min()), "last_seen": float(times.max()),
+                         "closest_m": float(dists[inside].min()), "samples": int(inside.sum())})
+        return sorted(hits, key=lambda h: h["closest_m"])
+
+    # --- compaction ---
+    def compact(self, db, now: Optional[float] = None) -> dict:
+        """
+        Moves every finished hour older than `raw_hours` from Redis into the DB (downsampled),
+        then drops DB rows past retention. Safe to re-run: an hour already in the DB is merged.
+        """
+        from .database import TrackHour
+        r = self.redis()
+        current = int(now or time.time()) // HOUR
+        last_done = r.get(COMPACTED_KEY)
+        # Nothing older than the key TTL can still be in Redis
+        oldest_live = current - self.key_ttl // HOUR - 1
+        first = max(int(last_done) + 1, oldest_live) if last_done is not None else oldest_live
+        stats = {"hours": 0, "users": 0, "samples_in": 0, "samples_out": 0}
+        for hour in range(first, current - self.raw_hours):
+            user_ids = sorted(int(u) for u in r.smembers(HISTORY_USERS_KEY.format(hour)))
+            blobs = self._redis_blobs([(user_id, hour) for user_id in user_ids])
+            existing = {row.user_id: row for row in db.query(TrackHour).filter(TrackHour.hour == hour, TrackHour.user_id.in_(user_ids))} if user_ids else {}
+            for user_id in user_ids:
+                blob = blobs.get((user_id, hour))
+                if not blob: continue
+                samples = decode_samples(blob, hour)
+                stats["samples_in"] += len(samples)
+                row = existing.get(user_id)
+                if row is not None: samples = np.concatenate([decode_samples(row.samples, hour), samples])
+                packed = downsample(samples, hour, self.downsample_seconds)
+                kept = decode_samples(packed, hour)
+                fields = {"samples": packed, "sample_count": len(kept),
+                          "min_lat": float(kept[:, 1].min()), "max_lat": float(kept[:, 1].max()),
+                          "min_lng": float(kept[:, 2].min()), "max_lng": float(kept[:, 2].max())}
+                if row is None: db.add(TrackHour(user_id=user_id, hour=hour, **fields))
+                else:
+                    for name, value in fields.items(): setattr(row, name, value)
+                stats["samples_out"] += len(kept)
+                stats["users"] += 1
+            db.commit()
+            # Only drop the raw copy once the downsampled one is durable
+            pipe = r.pipeline(transaction=False)
+            for user_id in user_ids: pipe.delete(HISTORY_KEY.format(user_id, hour))
+            pipe.delete(HISTORY_USERS_KEY.format(hour))
+            pipe.set(COMPACTED_KEY, hour)
+            pipe.execute()
+            stats["hours"] += 1
+        stats["expired_rows"] = db.query(TrackHour).filter(TrackHour.hour < current - self.retention_days * 24).delete(synchronize_session=False)
+        db.commit()
+        return stats
@@ -0,0 +1,306 @@
+"""
+Bulk place import and (re-)analysis pipeline.
+
+    python -m api.importer places.csv                 # insert + analyse inline
+    python -m api.importer places.jsonl --enqueue     # insert + hand analysis to api.worker
+    python -m api.importer --reanalyze --city Ooty    # re-run zone generation for existing places
+
+CSV needs a header row; both formats use the same keys as POST /api/admin/places
+(name, city, img, details, lat, lng, type, rating, fee).
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import sys
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+from . import metrics
+from .database import SessionLocal, Place
+
+
+def place_from_payload(place: dict) -> Place:
+    lat = float(place.get('lat')) if place.get('lat') else None
+    lng = float(place.get('lng')) if place.get('lng') else None
+    return Place(
+        name=place.get('name', 'Unknown'),
+        city=place.get('city', ''),
+        img=place.get('img', ''),
+        details=place.get('details', ''),
+        lat=lat, lng=lng
+    )
+
+
+def place_analysis_job(place_id: int, place: dict, idempotency_key: Optional[str] = None) -> tuple:
+    payload = {
+        "place_id": place_id, "name": place.get('name'),
+        "lat": float(place['lat']), "lng": float(place['lng']),
+        "type": place.get('type') or 'tourist attraction',
+        "rating": float(place.get('rating') or 4.5),
+        "fee": float(place.get('fee') or 0.0)
+    }
+    return ("place_analysis", payload, idempotency_key or f"place:{place_id}")
+
+
+# --- PARSING (streaming; never holds the whole file) ---
+def detect_format(name: str = "", content_type: str = "") -> str:
+    if "csv" in content_type or name.lower().endswith(".csv"): return "csv"
+    return "jsonl"
+
+
+def clean_row(row: dict) -> dict:
+    return {k.strip(): v.strip() if isinstance(v, str) else v for k, v in row.items() if k}
+
+
+def parse_records(lines: Iterable[str], fmt: str) -> Iterator[dict]:
+    if fmt == "csv":
+        for row in csv.DictReader(lines): yield clean_row(row)
+    else:
+        for line in lines:
+            line = line.strip()
+            if line: yield json.loads(line)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch: yield batch
+
+
+def insert_batch(db, records: list[dict]) -> list[tuple[int, dict]]:
+    """Inserts one batch in a single transaction; returns (place_id, record) for every row."""
+    places = [place_from_payload(rec) for rec in records]
+    db.add_all(places)
+    db.flush()
+    ids = [p.id for p in places]
+    db.commit()
+    return list(zip(ids, records))
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Chunk boundaries can fall inside a multibyte character; the decoder carries the partial bytes over
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines: yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer: yield buffer
+
+
+class LineFeed:
+    """Iterator a csv reader pulls from while lines are still arriving; never exhausted for good."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines: raise StopIteration
+        return self.lines.popleft()
+
+
+async def aparse_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[dict]:
+    if fmt != "csv":
+        async for line in aiter_lines(chunks):
+            if line.strip(): yield json.loads(line)
+        return
+    # One DictReader for the whole body, like the file path. It is only asked for a row once the
+    # feed holds a complete record (balanced quotes), so quoted newlines stay inside their field.
+    feed = LineFeed()
+    reader = csv.DictReader(feed)
+    record, quotes, has_header = [], 0, False
+    async for line in aiter_lines(chunks):
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2: continue
+        if any(part.strip() for part in record):
+            feed.lines.extend(record)
+            if has_header: yield clean_row(next(reader))
+            else: has_header = reader.fieldnames is not None
+        record, quotes = [], 0
+    if has_header and any(part.strip() for part in record):
+        # Unterminated quote at the end of the body; the reader closes the field
+        feed.lines.extend(record)
+        yield clean_row(next(reader))
+
+
+async def import_stream(chunks: AsyncIterator[bytes], fmt: str, submit: Callable, batch_size: int = 500,
+                        fallback: Optional[Callable] = None) -> dict:
+    """
+    Streams an uploaded CSV/JSONL body into batched inserts and submits each batch's analysis
+    jobs in one call (`submit` receives a list of job tuples). When `submit` raises, the batch's
+    jobs go to `fallback` instead (counted as inline), or are counted as failed without one;
+    either way the rest of the body is still imported. Returns summary counts.
+    """
+    summary = {"inserted": 0, "queued": 0, "inline": 0, "failed": 0, "skipped": 0, "batches": 0}
+    db = SessionLocal()
+
+    def flush(batch):
+        rows = insert_batch(db, batch)
+        jobs = [place_analysis_job(place_id, rec) for place_id, rec in rows if rec.get('lat') and rec.get('lng')]
+        if jobs:
+            try:
+                submit(jobs)
+                summary["queued"] += len(jobs)
+            except Exception as e:
+                # The places are already committed; only their analysis needs another route
+                metrics.errors.inc(source="job_submit")
+                print(f"Job queue unavailable for {len(jobs)} imported places: {e}", file=sys.stderr)
+                if fallback is None:
+                    summary["failed"] += len(jobs)
+                else:
+                    fallback(jobs)
+                    summary["inline"] += len(jobs)
+        summary["inserted"] += len(rows)
+        summary["skipped"] += len(rows) - len(jobs)
+        summary["batches"] += 1
+
+    try:
+        batch = []
+        async for rec in aparse_records(chunks, fmt):
+            batch.append(rec)
+            if len(batch) >= batch_size:
+                await asyncio.to_thread(flush, batch)
+                batch = []
+        if batch: await asyncio.to_thread(flush, batch)
+    finally:
+        db.close()
+    return summary
+
+
+# --- PIPELINE ---
+class Progress:
+    def __init__(self, report: Callable[[dict], None], every: float = 2.0):
+        self.report = report
+        self.every = every
+        self.counts = {"inserted": 0, "scanned": 0, "analysed": 0, "failed": 0, "skipped": 0}
+        self.started = time.monotonic()
+        self._last = 0.0
+
+    def add(self, key: str, n: int = 1):
+        self.counts[key] += n
+        now = time.monotonic()
+        if now - self._last >= self.every:
+            self._last = now
+            self.emit()
+
+    def emit(self, **extra):
+        self.report({**self.counts, "elapsed_s": round(time.monotonic() - self.started, 1), **extra})
+
+
+async def run_pipeline(records: Iterable[dict], analyse: Optional[Callable], wiki, progress: Progress,
+                       batch_size: int = 500, concurrency: int = 8, existing: bool = False):
+    """
+    Three overlapping stages connected by bounded queues:
+    insert (batched transactions) -> Wikipedia scan (one per geohash cell) -> zone generation.
+    With `existing=True` the records are already (place_id, record) pairs and nothing is inserted.
+    """
+    scan_q: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+    analyse_q: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+
+    async def insert_stage():
+        db = SessionLocal()
+        try:
+            source = batched(records, batch_size)
+            while True:
+                batch = await asyncio.to_thread(next, source, None)
+                if batch is None: break
+                rows = batch if existing else await asyncio.to_thread(insert_batch, db, batch)
+                if not existing: progress.add("inserted", len(rows))
+                for place_id, rec in rows:
+                    if rec.get('lat') and rec.get('lng'): await scan_q.put((place_id, rec))
+                    else: progress.add("skipped")
+        finally:
+            db.close()
+            for _ in range(concurrency): await scan_q.put(None)
+
+    async def scan_stage():
+        # Places in the same cell share one upstream call via the cache's in-flight coalescing
+        while (item := await scan_q.get()) is not None:
+            place_id, rec = item
+            if wiki is not None:
+                try: await wiki.geosearch(float(rec['lat']), float(rec['lng']), radius=10000, limit=100)
+                except Exception as e: print(f"Wikipedia API Error for place {place_id}: {e}", file=sys.stderr)
+                progress.add("scanned")
+            await analyse_q.put(item)
+        await analyse_q.put(None)
+
+    async def analyse_stage():
+        while (item := await analyse_q.get()) is not None:
+            place_id, rec = item
+            if analyse is None: continue
+            try:
+                await analyse(place_id, rec)
+                progress.add("analysed")
+            except Exception as e:
+                print(f"Analysis failed for place {place_id}: {e}", file=sys.stderr)
+                progress.add("failed")
+
+    await asyncio.gather(insert_stage(), *[scan_stage() for _ in range(concurrency)], *[analyse_stage() for _ in range(concurrency)])
+    progress.emit(done=True)
+
+
+def existing_places(city: Optional[str] = None, batch_size: int = 500) -> Iterator[tuple[int, dict]]:
+    db = SessionLocal()
+    try:
+        query = db.query(Place.id, Place.name, Place.lat, Place.lng).filter(Place.lat.isnot(None), Place.lng.isnot(None))
+        if city: query = query.filter(Place.city == city)
+        for place_id, name, lat, lng in query.order_by(Place.id).yield_per(batch_size):
+            yield place_id, {"name": name, "lat": lat, "lng": lng}
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import places and generate their safety zones.")
+    parser.add_argument("path", nargs="?", help="CSV or JSONL file ('-' for stdin)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel Wikipedia scans and zone generations")
+    parser.add_argument("--enqueue", action="store_true", help="submit analysis jobs for api.worker instead of running inline")
+    parser.add_argument("--reanalyze", action="store_true", help="re-run zone generation for places already in the DB")
+    parser.add_argument("--city", help="with --reanalyze, only places in this city")
+    args = parser.parse_args(argv)
+    if not args.path and not args.reanalyze: parser.error("a file path or --reanalyze is required")
+
+    from .index import generate_hybrid_smart_zones, job_queue
+    from .wiki import WikiGeoSearch
+
+    # Coarser (~5 km) cells than the API uses: places whose 10 km scans mostly overlap share one scan
+    wiki = WikiGeoSearch(precision=5)
+    progress = Progress(lambda p: print(json.dumps(p), file=sys.stderr))
+    run_id = int(time.time())
+
+    async def analyse(place_id: int, rec: dict):
+        kind, payload, key = place_analysis_job(place_id, rec, f"place:{place_id}:reanalyze:{run_id}" if args.reanalyze else None)
+        if args.enqueue:
+            await asyncio.to_thread(job_queue.submit, kind, payload, key)
+        else:
+            await generate_hybrid_smart_zones(payload["name"], payload["lat"], payload["lng"], payload["type"], payload["rating"], payload["fee"], wiki=wiki, place_id=place_id)
+
+    if args.reanalyze:
+        records, existing = existing_places(args.city, args.batch_size), True
+    else:
+        fh = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+        records, existing = parse_records(fh, args.format or detect_format(args.path)), False
+
+    async def run():
+        # Enqueued jobs scan Wikipedia in the worker, so there is nothing to prefetch here
+        try: await run_pipeline(records, analyse, None if args.enqueue else wiki, progress, args.batch_size, args.concurrency, existing)
+        finally: await wiki.aclose()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+
+from .geo import METERS_PER_DEG, distance_m
+
+
+# --- INCREMENTAL INCIDENT DENSITY ---
+# SOS reports are bucketed into ~1 km grid cells and kept for a sliding retention window.
+# "Incidents within R metres in the last T hours" then only touches the few cells around
+# the query point instead of every report from the last 48h.
+class IncidentDensity:
+    """
+    Process-local, sliding-window grid of recent incident reports.
+    Updated on insert by this process and topped up from the DB at most every `sync_interval`
+    seconds, so reports from other instances are counted too. Each sync re-reads rows reported
+    since the previous one started minus `overlap`: ids are not committed in order, so an id
+    watermark would skip a lower id that commits late. Re-read rows are deduped by id.
+    """
+
+    def __init__(self, retention: timedelta = timedelta(hours=48), cell_deg: float = 0.01, sync_interval: float = 10.0,
+                 overlap: timedelta = timedelta(minutes=1)):
+        self.retention = retention
+        self.cell_deg = cell_deg
+        self.sync_interval = sync_interval
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self._cells: dict[tuple[int, int], list[tuple[datetime, float, float]]] = {}
+        # id -> reported_at for every report still inside the retention window
+        self._ids: dict[int, datetime] = {}
+        self._sync_from: Optional[datetime] = None
+        self._synced_at: Optional[float] = None
+        self._syncing: Optional[asyncio.Future] = None
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def _insert(self, report_id: int, lat: float, lng: float, reported_at: datetime):
+        if report_id in self._ids: return
+        self._ids[report_id] = reported_at
+        self._cells.setdefault(self._cell(lat, lng), []).append((reported_at, lat, lng))
+
+    def add(self, report_id: int, lat: float, lng: float, reported_at: Optional[datetime] = None):
+        with self._lock:
+            self._insert(report_id, lat, lng, reported_at or datetime.utcnow())
+
+    def _sync_due(self) -> bool:
+        return self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval
+
+    def _sync_query(self):
+        from .database import IncidentReport
+        started = datetime.utcnow()
+        cutoff = started - self.retention
+        since = cutoff if self._sync_from is None else max(cutoff, self._sync_from - self.overlap)
+        return (started, cutoff), (select(IncidentReport.id, IncidentReport.lat, IncidentReport.lng, IncidentReport.reported_at)
+                                   .where(IncidentReport.reported_at >= since))
+
+    def _apply(self, rows, window: tuple[datetime, datetime]):
+        started, cutoff = window
+        with self._lock:
+            for report_id, lat, lng, reported_at in rows:
+                if lat is None or lng is None: continue
+                self._insert(report_id, lat, lng, reported_at)
+            self._expire(cutoff)
+            self._sync_from = started
+            self._synced_at = time.monotonic()
+
+    def ensure_synced(self, db):
+        if not self._sync_due(): return
+        window, query = self._sync_query()
+        self._apply(db.execute(query).all(), window)
+
+    async def ensure_synced_async(self, db):
+        """`ensure_synced` for an AsyncSession; concurrent callers share one in-flight query."""
+        if not self._sync_due(): return
+        task = self._syncing
+        if task is None:
+            task = self._syncing = asyncio.ensure_future(self._load_async(db))
+        try:
+            await asyncio.shield(task)
+        finally:
+            if self._syncing is task and task.done(): self._syncing = None
+
+    async def _load_async(self, db):
+        window, query = self._sync_query()
+        self._apply((await db.execute(query)).all(), window)
+
+    def _expire(self, cutoff: datetime):
+        for cell in list(self._cells):
+            kept = [e for e in self._cells[cell] if e[0] >= cutoff]
+            if kept: self._cells[cell] = kept
+            else: del self._cells[cell]
+        # A report past the window is never re-read by a sync, so its id can go with it
+        self._ids = {i: at for i, at in self._ids.items() if at >= cutoff}
+
+    def count(self, lat: float, lng: float, radius_m: float = 1000, window: timedelta = timedelta(hours=48)) -> int:
+        cutoff = datetime.utcnow() - min(window, self.retention)
+        lat_span = radius_m / METERS_PER_DEG
+        lng_span = lat_span / max(math.cos(math.radians(min(abs(lat) + lat_span, 89.0))), 1e-6)
+        (i0, j0), (i1, j1) = self._cell(lat - lat_span, lng - lng_span), self._cell(lat + lat_span, lng + lng_span)
+        total = 0
+        with self._lock:
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    for reported_at, p_lat, p_lng in self._cells.get((i, j), ()):
+                        if reported_at >= cutoff and distance_m(lat, lng, p_lat, p_lng) <= radius_m: total += 1
+        return total
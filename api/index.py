@@ -1,52 +1,186 @@
+import bisect
 import hashlib
-import os
 import json
-import redis
-import httpx
-import math
+import os
 import asyncio
+import heapq
+import time
 import pytz
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Request, Response, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select, delete, or_, and_
 from sqlalchemy.orm import Session
-from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, time as dt_time
+from typing import Optional
 from pydantic import BaseModel
 
-from .database import SessionLocal, User, pwd_context, SafeZone, Place, IncidentReport
+from .database import SessionLocal, AsyncSessionLocal, User, get_pwd_context, SafeZone, Place, IncidentReport
+from .geo import ZoneIndex, ZoneEntry, PointSet, haversine_m, bounding_box
+from .incidents import IncidentDensity
+from .ingest import LocationWriteBuffer
+from . import live, events, metrics
+from .wiki import WikiGeoSearch
+from .inference import HFPredictor
+from .jobs import JobQueue
+from .importer import place_from_payload, place_analysis_job, detect_format, import_stream
+from .auth import Claims, PasswordHasher, TokenVerifier, TTLCache
+from .history import LocationHistory
 
 app = FastAPI()
 
+# --- METRICS (scraped from /api/metrics; SSE streams would only skew the latency histograms) ---
+app.add_middleware(metrics.MetricsMiddleware, exclude=("/api/events", "/api/metrics"))
+metrics.instrument_sqlalchemy()
+
 # --- EXTERNAL API CONFIGURATION ---
 HF_API_URL = "https://sunil0034-rakshasetu-ai-engine.hf.space/gradio_api/call/predict"
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GOOGLE_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json" 
 
 # --- REDIS SETUP FOR SERVERLESS (VERCEL) ---
+# Created on first use: a cold start only imports and configures redis once a route needs it
 REDIS_URL = os.getenv("KV_URL") or os.getenv("REDIS_URL")
-if REDIS_URL:
-    r = redis.Redis.from_url(
-        REDIS_URL, 
-        decode_responses=True, 
-        socket_connect_timeout=5, 
-        socket_timeout=5,
-        health_check_interval=10 
-    )
-else:
-    r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+r = None
+
+def get_redis():
+    global r
+    if r is None:
+        import redis
+        if REDIS_URL:
+            r = redis.Redis.from_url(
+                REDIS_URL, 
+                decode_responses=True, 
+                socket_connect_timeout=5, 
+                socket_timeout=5,
+                health_check_interval=10 
+            )
+        else:
+            r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+    return r
+
+# Location history samples are binary, so they are read through a client that doesn't decode replies
+_raw_redis = None
+
+def get_raw_redis():
+    global _raw_redis
+    if _raw_redis is None:
+        import redis
+        _raw_redis = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=5, socket_timeout=5) if REDIS_URL else redis.Redis(host='localhost', port=6379, db=0)
+    return _raw_redis
+
+# Pub/sub listeners for the SSE channel need an asyncio client; created on first subscriber
+_async_redis = None
+
+def get_async_redis():
+    global _async_redis
+    if _async_redis is None:
+        import redis.asyncio as aioredis
+        _async_redis = aioredis.Redis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else aioredis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+    return _async_redis
 
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "fallback_dev_key")
 
+# --- AUTH (identity from verified JWT claims; bcrypt on its own bounded pool) ---
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+# Clients that predate tokens still identify by the `username` in the body; set to 0 to require a token
+ALLOW_BODY_USERNAME = os.getenv("AUTH_ALLOW_BODY_USERNAME", "1") == "1"
+token_verifier = TokenVerifier(SECRET_KEY, cache_ttl=AUTH_CACHE_TTL)
+password_hasher = PasswordHasher(get_pwd_context)
+# username -> (user id, is_admin), for body-username pings and tokens issued before the uid claim
+user_cache = TTLCache(max_entries=10_000, ttl=AUTH_CACHE_TTL)
+
+# --- SAFE ZONE SPATIAL INDEX (rebuilt when the shared zone version moves, else every ZONE_INDEX_TTL seconds) ---
+# Every zone create/delete bumps ZONE_VERSION_KEY; each lookup reads it (one GET), so other
+# instances see a new SOS zone or a deleted zone on their next ping. Only while Redis is
+# unreachable does an instance fall back to answering from a copy up to ZONE_INDEX_TTL old.
+ZONE_VERSION_KEY = "zones:version"
+
+def publish_expired_zones(zone_ids):
+    # Every instance notices the same expiry on rebuild; SET NX lets only the first one announce it
+    def announce():
+        for zone_id in zone_ids:
+            if get_redis().set(f"zone:expired:{zone_id}", 1, nx=True, ex=24 * 3600):
+                events.publish(get_redis(), "zone.expired", {"id": zone_id})
+    redis_call(announce, op="zone_expired_publish")
+
+zone_index = ZoneIndex(
+    max_age=float(os.getenv("ZONE_INDEX_TTL", "30")),
+    on_expired=lambda zones: publish_expired_zones([z.id for z in zones]),
+    is_active=lambda zone, now_utc, now_ist_time: is_zone_active(zone, now_utc, now_ist_time),
+    tz=pytz.timezone('Asia/Kolkata')
+)
+ZONE_SWEEP_SECONDS = float(os.getenv("ZONE_SWEEP_SECONDS", "300"))
+_last_zone_sweep = 0.0
+
+# --- SHARED, CACHED WIKIPEDIA GEOSEARCH CLIENT ---
+wiki_search = WikiGeoSearch(redis=get_redis, ttl=float(os.getenv("WIKI_CACHE_TTL", str(6 * 3600))))
+
+# --- SHARED HF MODEL CLIENT (bounded concurrency, memoized predictions) ---
+hf_predictor = HFPredictor(HF_API_URL, max_concurrency=int(os.getenv("HF_MAX_CONCURRENCY", "4")))
+
+# --- DURABLE JOB QUEUE FOR PLACE ANALYSIS (processed by `python -m api.worker`) ---
+job_queue = JobQueue(redis=get_redis, max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "5")))
+
+# --- SLIDING-WINDOW INCIDENT DENSITY (SOS cluster detection) ---
+incident_density = IncidentDensity(sync_interval=float(os.getenv("INCIDENT_SYNC_SECONDS", "10")),
+                                   overlap=timedelta(seconds=float(os.getenv("INCIDENT_SYNC_OVERLAP_SECONDS", "60"))))
+
+# --- WRITE-BEHIND BUFFER FOR LAST KNOWN POSITIONS ---
+location_buffer = LocationWriteBuffer(
+    flush_size=int(os.getenv("LOCATION_FLUSH_SIZE", "200")),
+    flush_interval=float(os.getenv("LOCATION_FLUSH_SECONDS", "2")),
+    on_due=lambda: flush_location_buffer()
+)
+
+# --- LOCATION HISTORY (raw samples in Redis, downsampled hours in the DB) ---
+location_history = LocationHistory(
+    redis=get_redis, raw_redis=get_raw_redis,
+    raw_hours=int(os.getenv("HISTORY_RAW_HOURS", "2")),
+    downsample_seconds=int(os.getenv("HISTORY_DOWNSAMPLE_SECONDS", "30")),
+    retention_days=int(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+)
+HISTORY_MAX_QUERY_HOURS = float(os.getenv("HISTORY_MAX_QUERY_HOURS", "72"))
+
 # --- SCHEMAS ---
 class UserCreate(BaseModel): username: str; password: str; passport: str
-class LocationUpdate(BaseModel): username: str; lat: float; lng: float
+class LocationUpdate(BaseModel): username: Optional[str] = None; lat: float; lng: float
 
 def get_db():
     db = SessionLocal()
     try: yield db
     finally: db.close()
 
+async def get_async_db():
+    # For `async def` routes, so DB round trips don't block the event loop
+    async with AsyncSessionLocal() as db: yield db
+
+def current_claims(authorization: Optional[str] = Header(None)) -> Optional[Claims]:
+    # No header means an anonymous (legacy) caller; a header that doesn't verify is always a 401
+    if not authorization: return None
+    scheme, _, token = authorization.partition(" ")
+    claims = token_verifier.verify(token) if scheme.lower() == "bearer" and token else None
+    if claims is None: raise HTTPException(status_code=401)
+    return claims
+
+def resolve_user(claims: Optional[Claims], username: Optional[str], db: Session) -> tuple[str, int]:
+    """(username, user id) of the caller: token claims first, then the cached legacy lookup."""
+    if claims is not None:
+        if claims.user_id is not None: return claims.username, claims.user_id
+        username = claims.username
+    elif not ALLOW_BODY_USERNAME or not username:
+        raise HTTPException(status_code=401)
+    cached = user_cache.get(username)
+    metrics.cache_requests.inc(cache="user", result="miss" if cached is None else "hit")
+    if cached is None:
+        row = db.query(User.id, User.is_admin).filter(User.username == username).first()
+        if not row: raise HTTPException(status_code=404)
+        cached = (row.id, row.is_admin)
+        user_cache.put(username, cached)
+    return username, cached[0]
+
 def create_digital_id(passport: str):
     return "DID_" + hashlib.sha256(passport.encode()).hexdigest()[:12].upper()
 
@@ -59,174 +193,450 @@ def is_zone_active(zone: SafeZone, current_utc: datetime, current_ist_time) -> b
             return current_ist_time >= zone.active_from or current_ist_time <= zone.active_to
     return True
 
-def get_safety_status(lat, lng, db):
-    now_utc = datetime.utcnow()
-    ist = pytz.timezone('Asia/Kolkata')
-    now_ist_time = datetime.now(ist).time()
-    zones = db.query(SafeZone).all()
-    active_zones = [z for z in zones if is_zone_active(z, now_utc, now_ist_time)]
+def sweep_expired_zones(db: Session) -> list[int]:
+    """Bulk-deletes zones whose expires_at has passed (crowdsourced SOS zones) and announces them."""
+    expired_ids = [zone_id for (zone_id,) in db.query(SafeZone.id).filter(SafeZone.expires_at < datetime.utcnow()).all()]
+    for i in range(0, len(expired_ids), 1000):
+        db.query(SafeZone).filter(SafeZone.id.in_(expired_ids[i:i + 1000])).delete(synchronize_session=False)
+    db.commit()
+    for zone_id in expired_ids: zone_index.remove(zone_id)
+    if expired_ids: publish_expired_zones(expired_ids)
+    return expired_ids
+
+def compact_location_history(db: Session) -> Optional[dict]:
+    # One compactor at a time across instances/workers; None when another run holds the lock
+    if not redis_call(lambda: get_redis().set("hist:compact:lock", 1, nx=True, ex=600), op="history_lock"): return None
+    try: return location_history.compact(db)
+    finally: redis_call(lambda: get_redis().delete("hist:compact:lock"), op="history_lock")
+
+def publish_zone_changes(changes: list[tuple[str, dict]]):
+    # Bumped after the DB commit, so an instance that sees the new version also sees the change
+    def announce():
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incr(ZONE_VERSION_KEY)
+        for kind, payload in changes: events.pipeline_publish(pipe, kind, payload)
+        return pipe.execute()[0]
+    zone_index.note_version(redis_call(announce, op="zone_publish"))
+
+def refresh_zone_index(db: Session):
+    # Piggy-back the expiry sweep on index rebuilds; the Redis lock keeps it to one instance per interval
+    global _last_zone_sweep
+    version = redis_call(lambda: int(get_redis().get(ZONE_VERSION_KEY) or 0), op="zone_version")
+    zone_index.check_version(version)
+    if not zone_index.is_stale(): return
+    if time.monotonic() - _last_zone_sweep >= ZONE_SWEEP_SECONDS:
+        _last_zone_sweep = time.monotonic()
+        if redis_call(lambda: get_redis().set("zones:sweep:lock", 1, nx=True, ex=int(ZONE_SWEEP_SECONDS)), op="zone_sweep_lock"):
+            try: sweep_expired_zones(db)
+            except Exception as e:
+                db.rollback()
+                metrics.errors.inc(source="zone_sweep")
+                print(f"Zone sweep error: {e}")
+    zone_index.ensure_fresh(db, version)
+
+def get_safety_statuses(points, db):
+    refresh_zone_index(db)
     
-    for zone in active_zones:
-        distance = math.sqrt((lat - zone.lat)**2 + (lng - zone.lng)**2) * 111000 
-        if distance <= zone.radius:
-            return f"Entered {zone.name}", "danger" if zone.category != "Safe" else "success"
-    return "You are in a safe area", "info"
+    results = []
+    for hits in zone_index.containing_many(points, active_only=True):
+        zone = hits[0] if hits else None
+        results.append((f"Entered {zone.name}", "danger" if zone.category != "Safe" else "success") if zone else ("You are in a safe area", "info"))
+    return results
+
+def get_safety_status(lat, lng, db):
+    return get_safety_statuses([(lat, lng)], db)[0]
+
+def redis_call(fn, op: str = None):
+    # Serverless Redis connections go stale between invocations; reconnect once before giving up.
+    # Failures still return None, but are counted per `op` instead of vanishing.
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    op = op or fn.__name__
+    started = time.perf_counter()
+    try:
+        return fn()
+    except RedisConnectionError:
+        metrics.redis_reconnects.inc(op=op)
+        get_redis().connection_pool.disconnect()
+        try: return fn()
+        except Exception as e: metrics.redis_errors.inc(op=op, error=type(e).__name__)
+    except Exception as e: metrics.redis_errors.inc(op=op, error=type(e).__name__)
+    finally: metrics.redis_duration.observe(time.perf_counter() - started, op=op)
 
 @app.post("/api/signup")
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.username == user.username).first(): raise HTTPException(status_code=400)
-    new_user = User(username=user.username, hashed_password=pwd_context.hash(user.password), digital_id=create_digital_id(user.passport))
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if (await db.execute(select(User.id).where(User.username == user.username))).first(): raise HTTPException(status_code=400)
+    new_user = User(username=user.username, hashed_password=await password_hasher.hash(user.password), digital_id=create_digital_id(user.passport))
     db.add(new_user)
-    db.commit()
+    await db.commit()
     return {"message": "User created", "digital_id": new_user.digital_id}
 
 @app.post("/api/login")
-def login(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if not db_user or not pwd_context.verify(user.password, db_user.hashed_password): raise HTTPException(status_code=401)
-    token = jwt.encode({"sub": db_user.username, "is_admin": db_user.is_admin, "exp": datetime.utcnow() + timedelta(hours=24)}, SECRET_KEY, algorithm="HS256")
+async def login(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User).where(User.username == user.username))).scalar_one_or_none()
+    valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password) if db_user else (False, None)
+    if not valid: raise HTTPException(status_code=401)
+    if new_hash:
+        # Stored at a different bcrypt cost; upgrade it while we have the plaintext
+        db_user.hashed_password = new_hash
+        await db.commit()
+    token = token_verifier.issue(db_user.username, db_user.id, db_user.is_admin)
     return {"access_token": token, "username": db_user.username, "is_admin": db_user.is_admin}
 
 @app.post("/api/update-location")
-def update_location(loc: LocationUpdate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == loc.username).first()
-    if not db_user: raise HTTPException(status_code=404)
+def update_location(loc: LocationUpdate, claims: Optional[Claims] = Depends(current_claims), db: Session = Depends(get_db)):
+    username, user_id = resolve_user(claims, loc.username, db)
     
-    db_user.last_lat, db_user.last_lng = loc.lat, loc.lng
-    db.commit()
+    location_buffer.add(user_id, loc.lat, loc.lng)
+    if location_buffer.is_due():
+        try: location_buffer.flush(db)
+        except Exception as e:
+            db.rollback()
+            metrics.errors.inc(source="location_flush")
+            print(f"Location flush error: {e}")
     
-    redis_payload = json.dumps({"lat": loc.lat, "lng": loc.lng})
-    try:
-        r.setex(f"live_loc:{loc.username}", 60, redis_payload)
-    except redis.exceptions.ConnectionError:
-        r.connection_pool.disconnect()
-        try:
-            r.setex(f"live_loc:{loc.username}", 60, redis_payload)
-        except Exception: pass
-    except Exception: pass
+    def record():
+        # Live position and history sample go out in one round trip
+        pipe = get_redis().pipeline(transaction=False)
+        live.queue_positions(pipe, {username: (loc.lat, loc.lng)})
+        location_history.queue_append(pipe, {user_id: (loc.lat, loc.lng)})
+        pipe.execute()
+    redis_call(record, op="record_location")
         
     status, alert_level = get_safety_status(loc.lat, loc.lng, db)
     return {"status": status, "alert_level": alert_level, "lat": loc.lat, "lng": loc.lng}
 
+@app.post("/api/update-locations")
+def update_locations(pings: list[LocationUpdate], claims: Optional[Claims] = Depends(current_claims), db: Session = Depends(get_db)):
+    if not pings: return []
+    if claims is not None and not claims.is_admin:
+        # A tourist's token only covers their own pings (e.g. a backlog uploaded after being offline)
+        username, user_id = resolve_user(claims, None, db)
+        names = [p.username or username for p in pings]
+        user_ids = {username: user_id}
+    else:
+        # Admin tokens may relay pings for anyone; anonymous callers only while body usernames are allowed
+        if claims is None and not ALLOW_BODY_USERNAME: raise HTTPException(status_code=401)
+        names = [p.username for p in pings]
+        user_ids = dict(db.query(User.username, User.id).filter(User.username.in_({n for n in names if n})).all())
+    
+    # Only the latest ping per user matters for the stored position
+    latest = {name: p for name, p in zip(names, pings) if name in user_ids}
+    if latest:
+        # Through the buffer, so single pings still waiting in it can't overwrite these newer positions later
+        for name, p in latest.items(): location_buffer.add(user_ids[name], p.lat, p.lng)
+        try: location_buffer.flush(db)
+        except Exception as e:
+            # The buffer keeps the rows for the next flush; live positions and statuses still go out
+            db.rollback()
+            metrics.errors.inc(source="location_flush")
+            print(f"Location flush error: {e}")
+        def record():
+            pipe = get_redis().pipeline(transaction=False)
+            live.queue_positions(pipe, {name: (p.lat, p.lng) for name, p in latest.items()})
+            location_history.queue_append(pipe, {user_ids[name]: (p.lat, p.lng) for name, p in latest.items()})
+            pipe.execute()
+        redis_call(record, op="record_locations")
+    
+    statuses = iter(get_safety_statuses([(p.lat, p.lng) for name, p in zip(names, pings) if name in user_ids], db))
+    results = []
+    for name, p in zip(names, pings):
+        if name not in user_ids:
+            results.append({"username": name, "error": "Not allowed" if claims is not None and not claims.is_admin else "User not found", "lat": p.lat, "lng": p.lng})
+            continue
+        status, alert_level = next(statuses)
+        results.append({"username": name, "status": status, "alert_level": alert_level, "lat": p.lat, "lng": p.lng})
+    return results
+
+@app.on_event("shutdown")
+def flush_location_buffer():
+    db = SessionLocal()
+    try: location_buffer.flush(db)
+    except Exception as e:
+        metrics.errors.inc(source="location_flush")
+        print(f"Location flush error: {e}")
+    finally: db.close()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await wiki_search.aclose()
+    await hf_predictor.aclose()
+    password_hasher.shutdown()
+
 @app.post("/api/tourist/sos")
-def report_sos_incident(loc: LocationUpdate, db: Session = Depends(get_db)):
-    db.add(IncidentReport(username=loc.username, lat=loc.lat, lng=loc.lng))
-    db.commit()
-    recent_incidents = db.query(IncidentReport).filter(IncidentReport.reported_at >= datetime.utcnow() - timedelta(hours=48)).all()
-    cluster_count = sum(1 for inc in recent_incidents if math.sqrt((loc.lat - inc.lat)**2 + (loc.lng - inc.lng)**2) * 111000 <= 1000)
+def report_sos_incident(loc: LocationUpdate, claims: Optional[Claims] = Depends(current_claims), db: Session = Depends(get_db)):
+    username, _ = resolve_user(claims, loc.username, db)
+    report = IncidentReport(username=username, lat=loc.lat, lng=loc.lng, reported_at=datetime.utcnow())
+    db.add(report)
+    db.flush()
+    incident_density.ensure_synced(db)
+    incident_density.add(report.id, report.lat, report.lng, report.reported_at)
+    cluster_count = incident_density.count(loc.lat, loc.lng, 1000, timedelta(hours=48))
     rad, cat, z_name = (800, "High Danger", "CRITICAL: SOS Alerts!") if cluster_count >= 3 else (200, "Danger", "CAUTION: SOS Reported")
-    db.add(SafeZone(name=z_name, lat=loc.lat, lng=loc.lng, radius=rad, category=cat, expires_at=datetime.utcnow() + timedelta(hours=6), source="UserSOS"))
+    sos_zone = SafeZone(name=z_name, lat=loc.lat, lng=loc.lng, radius=rad, category=cat, expires_at=datetime.utcnow() + timedelta(hours=6), source="UserSOS")
+    db.add(sos_zone)
+    db.flush()
+    zone_entry = ZoneEntry.from_model(sos_zone)
     db.commit()
+    zone_index.add(zone_entry)
+    publish_zone_changes([("zone.created", events.zone_payload(zone_entry))])
     return {"message": "Danger zone mapped."}
 
 @app.get("/api/tourist/explore-google")
-async def explore_nearby_tourist_only(lat: float, lng: float, db: Session = Depends(get_db)):
+async def explore_nearby_tourist_only(lat: float, lng: float, db: AsyncSession = Depends(get_async_db)):
     places = []
-    headers = {"User-Agent": "RakshaSetu/1.0 (sunilpandab37@gmail.com)"}
-    wiki_url = f"https://en.wikipedia.org/w/api.php?action=query&generator=geosearch&ggscoord={lat}|{lng}&ggsradius=10000&ggslimit=20&prop=description|coordinates&format=json"
 
     try:
-        async with httpx.AsyncClient(timeout=10.0, headers=headers) as client:
-            res = await client.get(wiki_url)
-            if res.status_code == 200:
-                data = res.json().get('query', {}).get('pages', {})
-                tourist_keywords = ["temple", "monument", "museum", "park", "beach", "palace", "historic", "sanctuary", "landmark", "fort", "lake", "waterfall", "church", "mosque", "garden", "wildlife", "nature", "ancient","tourist","places"]
-
-                for page_id, info in data.items():
-                    desc = info.get('description', '').lower()
-                    title = info.get('title', '').lower()
+        data = await wiki_search.geosearch(lat, lng, radius=10000, limit=20)
+        tourist_keywords = ["temple", "monument", "museum", "park", "beach", "palace", "historic", "sanctuary", "landmark", "fort", "lake", "waterfall", "church", "mosque", "garden", "wildlife", "nature", "ancient","tourist","places"]
+
+        for page_id, info in data.items():
+            desc = info.get('description', '').lower()
+            title = info.get('title', '').lower()
+            
+            if any(word in desc or word in title for word in tourist_keywords):
+                coords_list = info.get('coordinates', [])
+                if coords_list:
+                    p_lat = coords_list[0].get('lat')
+                    p_lng = coords_list[0].get('lon')
                     
-                    if any(word in desc or word in title for word in tourist_keywords):
-                        coords_list = info.get('coordinates', [])
-                        if coords_list:
-                            p_lat = coords_list[0].get('lat')
-                            p_lng = coords_list[0].get('lon')
-                            
-                            if p_lat is not None and p_lng is not None:
-                                dist = math.sqrt((lat - p_lat)**2 + (lng - p_lng)**2) * 111
-                                places.append({
-                                    "id": str(page_id),
-                                    "name": info.get('title'),
-                                    "lat": p_lat, "lng": p_lng,
-                                    "rating": "Wiki", "distance": dist
-                                })
+                    if p_lat is not None and p_lng is not None:
+                        places.append({
+                            "id": str(page_id),
+                            "name": info.get('title'),
+                            "lat": p_lat, "lng": p_lng,
+                            "rating": "Wiki"
+                        })
     except Exception as e:
+        metrics.errors.inc(source="wiki_explore")
         print(f"Wikipedia API Error: {e}")
 
-    if len(places) < 5:
-        internal_places = db.query(Place).all()
-        for p in internal_places:
-            if p.lat is not None and p.lng is not None:
-                dist = math.sqrt((lat - p.lat)**2 + (lng - p.lng)**2) * 111
-                if not any(p.name.lower() in item['name'].lower() for item in places):
-                    places.append({
-                        "id": f"db_{p.id}", "name": p.name, 
-                        "lat": p.lat, "lng": p.lng,
-                        "rating": "Local", "distance": dist
-                    })
-
+    # Distances in km, computed for all candidates in one pass
+    if places:
+        dists = haversine_m(lat, lng, [p['lat'] for p in places], [p['lng'] for p in places]) / 1000
+        for p, d in zip(places, dists): p['distance'] = float(d)
     places.sort(key=lambda x: x['distance'])
+
+    if len(places) < 5:
+        # Top-k merge of the (sorted) Wikipedia hits with the nearest local places, deduped by name
+        local = [{"id": f"db_{p.id}", "name": p.name, "lat": p.lat, "lng": p.lng, "rating": "Local", "distance": d / 1000}
+                 for p, d in await nearest_places(db, lat, lng, 10 + len(places))]
+        seen, merged = set(), []
+        for item in heapq.merge(places, local, key=lambda x: x['distance']):
+            key = normalize_place_name(item['name'])
+            if key in seen: continue
+            seen.add(key)
+            merged.append(item)
+            if len(merged) == 10: break
+        return merged
     return places[:10]
 
+def normalize_place_name(name: str) -> str:
+    return " ".join("".join(ch for ch in (name or "").lower() if ch.isalnum() or ch.isspace()).split())
+
+async def nearest_places(db: AsyncSession, lat: float, lng: float, k: int, radii=(10_000, 50_000, 250_000, None)) -> list:
+    """k nearest geocoded places, widening an indexed bounding box until k lie inside its circle."""
+    for radius in radii:
+        query = select(Place).where(Place.lat.isnot(None), Place.lng.isnot(None))
+        if radius is not None:
+            min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius)
+            query = query.where(Place.lat.between(min_lat, max_lat), Place.lng.between(min_lng, max_lng))
+        points = PointSet.from_objects((await db.execute(query)).scalars().all())
+        # A box corner can hold rows farther away than a closer place just outside the box's edge,
+        # so only rows within `radius` prove the k nearest have been seen
+        if radius is None or points.count_within(lat, lng, radius) >= k: break
+    return points.nearest(lat, lng, k)
+
 @app.get("/api/admin/tourists")
-def get_all_tourists(db: Session = Depends(get_db)):
+def get_all_tourists(response: Response, since: float = None, db: Session = Depends(get_db)):
+    response.headers["X-Server-Time"] = str(time.time())
+    if since is not None: return get_tourist_changes(since, db)
     users = db.query(User).filter(User.is_admin == False).all()
     if not users: return []
-    try: live_data_list = r.mget([f"live_loc:{u.username}" for u in users])
-    except: live_data_list = [None] * len(users)
-    return [{"id": u.id, "username": u.username, "last_lat": json.loads(l)["lat"] if l else u.last_lat, "last_lng": json.loads(l)["lng"] if l else u.last_lng, "is_online": l is not None} for u, l in zip(users, live_data_list)]
+    redis_call(lambda: live.prune_stale(get_redis()), op="live_prune")
+    online = redis_call(lambda: live.online_positions(get_redis()), op="live_online") or {}
+    return [{"id": u.id, "username": u.username, "last_lat": online[u.username][0] if u.username in online else u.last_lat, "last_lng": online[u.username][1] if u.username in online else u.last_lng, "is_online": u.username in online} for u in users]
+
+def get_tourist_changes(since: float, db: Session):
+    # Delta query: only tourists who pinged or went offline after `since` (pass back X-Server-Time)
+    changed = redis_call(lambda: live.changed_since(get_redis(), since), op="live_changed")
+    if changed is None: return []
+    moved, went_offline = changed
+    names = set(moved) | set(went_offline)
+    if not names: return []
+    users = db.query(User).filter(User.is_admin == False, User.username.in_(names)).all()
+    return [{"id": u.id, "username": u.username, "last_lat": moved[u.username][0] if u.username in moved else u.last_lat, "last_lng": moved[u.username][1] if u.username in moved else u.last_lng, "is_online": u.username in moved} for u in users]
+
+# --- ONLINE TOURIST SNAPSHOT (live:seen only; offline tourists are never loaded) ---
+TOURIST_CHUNK = 500
+
+def tourist_accounts(usernames: list[str]) -> dict[str, tuple[int, bool]]:
+    # username -> (id, is_admin) from the shared user cache; misses are fetched in one query
+    accounts, missing = {}, []
+    for name in usernames:
+        cached = user_cache.get(name)
+        if cached is None: missing.append(name)
+        else: accounts[name] = cached
+    metrics.cache_requests.inc(len(usernames) - len(missing), cache="user", result="hit")
+    metrics.cache_requests.inc(len(missing), cache="user", result="miss")
+    if missing:
+        with SessionLocal() as db:
+            for user_id, name, is_admin in db.query(User.id, User.username, User.is_admin).filter(User.username.in_(missing)):
+                accounts[name] = (user_id, is_admin)
+                user_cache.put(name, accounts[name])
+    return accounts
+
+def online_tourist_rows(usernames: list[str], known: Optional[dict] = None):
+    """Rows for the given online usernames, built TOURIST_CHUNK at a time; admins and deleted users are skipped."""
+    for start in range(0, len(usernames), TOURIST_CHUNK):
+        chunk = usernames[start:start + TOURIST_CHUNK]
+        coords = {name: known[name] for name in chunk} if known is not None else redis_call(lambda: live.positions(get_redis(), chunk), op="live_positions") or {}
+        accounts = tourist_accounts([name for name in chunk if name in coords])
+        for name in chunk:
+            account = accounts.get(name)
+            if account is None or account[1]: continue
+            yield {"id": account[0], "username": name, "last_lat": coords[name][0], "last_lng": coords[name][1], "is_online": True}
+
+@app.get("/api/admin/tourists/online")
+def get_online_tourists(request: Request, min_lat: float = None, min_lng: float = None, max_lat: float = None, max_lng: float = None,
+                        limit: int = Query(None, ge=1, le=10_000), cursor: str = None, format: str = None):
+    # Same rows as /api/admin/tourists, online tourists only, optionally inside a viewport.
+    # Ordered by username; with `limit`, pass X-Next-Cursor back as `cursor` for the next page.
+    # `format=ndjson` (or Accept: application/x-ndjson) streams one JSON object per line.
+    box = (min_lat, min_lng, max_lat, max_lng)
+    if any(v is None for v in box) and any(v is not None for v in box): raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lng, max_lat and max_lng")
+    if box[0] is not None and (min_lat > max_lat or min_lng > max_lng): raise HTTPException(status_code=400, detail="Invalid bounding box")
+    redis_call(lambda: live.prune_stale(get_redis()), op="live_prune")
+    if box[0] is not None:
+        known = redis_call(lambda: live.online_in_box(get_redis(), *box), op="live_box") or {}
+        usernames = sorted(known)
+    else:
+        known = None
+        usernames = sorted(redis_call(lambda: live.online_names(get_redis()), op="live_online") or [])
+    if cursor is not None: usernames = usernames[bisect.bisect_right(usernames, cursor):]
+    headers = {"X-Server-Time": str(time.time())}
+    if limit is not None and len(usernames) > limit:
+        usernames = usernames[:limit]
+        headers["X-Next-Cursor"] = usernames[-1]
+    rows = online_tourist_rows(usernames, known)
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse((json.dumps(row) + "\n" for row in rows), media_type="application/x-ndjson", headers=headers)
+    return JSONResponse(list(rows), headers=headers)
+
+@app.get("/api/admin/tourists/near")
+def get_tourists_near(lat: float, lng: float, radius_km: float = 1.0):
+    redis_call(lambda: live.prune_stale(get_redis()), op="live_prune")
+    return redis_call(lambda: live.tourists_within(get_redis(), lat, lng, radius_km * 1000), op="live_within") or []
+
+@app.get("/api/admin/safe-zones/{zone_id}/tourists")
+def get_tourists_in_zone(zone_id: int, db: Session = Depends(get_db)):
+    db_zone = db.query(SafeZone).filter(SafeZone.id == zone_id).first()
+    if not db_zone: raise HTTPException(status_code=404)
+    return redis_call(lambda: live.tourists_within(get_redis(), db_zone.lat, db_zone.lng, db_zone.radius), op="live_within") or []
 
 @app.delete("/api/admin/tourist-location/{username}")
 def delete_live_location(username: str):
-    try: r.delete(f"live_loc:{username}")
-    except: pass
+    redis_call(lambda: live.remove(get_redis(), username), op="live_remove")
     return {"message": "Trace cleared"}
 
 @app.delete("/api/admin/users/{user_id}")
 def delete_user_permanently(user_id: int, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user: 
-        try: r.delete(f"live_loc:{db_user.username}")
-        except: pass
+        redis_call(lambda: live.remove(get_redis(), db_user.username), op="live_remove")
+        user_cache.pop(db_user.username)
         db.delete(db_user); db.commit()
     return {"message": "User deleted."}
 
 @app.get("/api/admin/safe-zones")
-def get_safe_zones(db: Session = Depends(get_db)):
-    now_utc, now_ist_time = datetime.utcnow(), datetime.now(pytz.timezone('Asia/Kolkata')).time()
-    return [z for z in db.query(SafeZone).all() if is_zone_active(z, now_utc, now_ist_time)]
+def get_safe_zones(request: Request, response: Response, db: Session = Depends(get_db)):
+    refresh_zone_index(db)
+    active, digest = zone_index.active()
+    
+    # Clients that already hold this exact active set get a bodiless 304
+    etag = f'"{digest}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return active
 
 @app.delete("/api/admin/safe-zones/{zone_id}")
 def delete_safe_zone(zone_id: int, db: Session = Depends(get_db)):
     db_zone = db.query(SafeZone).filter(SafeZone.id == zone_id).first()
     if db_zone: db.delete(db_zone); db.commit()
+    zone_index.remove(zone_id)
+    if db_zone: publish_zone_changes([("zone.deleted", {"id": zone_id})])
     return {"message": "Zone deleted"}
 
+@app.post("/api/admin/safe-zones/sweep")
+def sweep_safe_zones(db: Session = Depends(get_db)):
+    # For an external scheduler; api.worker also sweeps on its housekeeping loop
+    return {"purged": len(sweep_expired_zones(db))}
+
+def history_window(start: Optional[float], end: Optional[float]) -> tuple[float, float]:
+    end = end or time.time()
+    start = start or end - 3600
+    if start > end or end - start > HISTORY_MAX_QUERY_HOURS * 3600: raise HTTPException(status_code=400, detail="Invalid time window")
+    return start, end
+
+@app.get("/api/admin/history/near")
+def get_history_near(lat: float, lng: float, radius_m: float = Query(500, gt=0, le=50_000), start: float = None, end: float = None, db: Session = Depends(get_db)):
+    # Everyone who passed within radius_m of a point during [start, end] (unix seconds; default the last hour)
+    start, end = history_window(start, end)
+    hits = location_history.near(db, lat, lng, radius_m, start, end)
+    names = dict(db.query(User.id, User.username).filter(User.id.in_([h["user_id"] for h in hits])).all()) if hits else {}
+    return [{**h, "username": names.get(h["user_id"])} for h in hits]
+
+@app.get("/api/admin/history/{user_id}")
+def get_history_track(user_id: int, start: float = None, end: float = None, db: Session = Depends(get_db)):
+    start, end = history_window(start, end)
+    return {"user_id": user_id, "start": start, "end": end, "points": location_history.track(db, user_id, start, end)}
+
+@app.post("/api/admin/history/compact")
+def compact_history(db: Session = Depends(get_db)):
+    # For an external scheduler; api.worker also compacts on its housekeeping loop
+    stats = compact_location_history(db)
+    return stats if stats is not None else {"message": "Compaction already running"}
+
+@app.get("/api/metrics")
+def get_metrics():
+    # Prometheus text format, for this process only (each serverless instance and worker reports its own)
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/events")
+async def stream_events(topics: str = ""):
+    # Server-Sent Events: zone.created / zone.deleted / zone.expired and tourist.positions / tourist.offline
+    wanted = {t for t in topics.split(",") if t in events.TOPICS} or None
+    return StreamingResponse(
+        events.sse_stream(get_async_redis(), wanted), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/places")
-def get_places(db: Session = Depends(get_db)):
-    return db.query(Place).all()
+def get_places(response: Response, limit: int = Query(None, ge=1, le=1000), cursor: int = None, db: Session = Depends(get_db)):
+    # Without `limit` the full list is returned (existing clients); with it, keyset pages by id
+    query = db.query(Place).order_by(Place.id)
+    if cursor is not None: query = query.filter(Place.id > cursor)
+    if limit is None: return query.all()
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
 
 # --- FUSED WIKI + HF AI EVALUATION LOGIC ---
-async def evaluate_hybrid_safety(p_name: str, p_type: str, lat: float, lng: float, p_rating: float, p_fee: float, db: Session) -> dict:
+async def evaluate_hybrid_safety(p_name: str, p_type: str, lat: float, lng: float, p_rating: float, p_fee: float, db: AsyncSession) -> dict:
     """
     Combines HF Model, Crime DB, and Time-Heuristics to return full timing context.
     Allows Wiki locations to be evaluated by the Hugging Face AI.
     """
     base_category = "Safe"
     
-    # 1. Ask the Hugging Face AI Space
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            res = await client.post(HF_API_URL, json={"data": [p_type, p_rating, p_fee]})
-            if res.status_code == 200:
-                event_id = res.json().get("event_id")
-                await asyncio.sleep(0.5) 
-                prediction = (await client.get(f"{HF_API_URL}/{event_id}")).json().get('data', [0])[0] 
-                base_category = {0: "Safe", 1: "Danger", 2: "High Danger"}.get(int(prediction), "Safe")
-    except: pass
+    # 1. Ask the Hugging Face AI Space (memoized, concurrency-limited)
+    base_category = await hf_predictor.category(p_type, p_rating, p_fee, default=base_category)
 
     # 2. Local Database Crime Density Failsafe
-    incident_count = sum(1 for inc in db.query(IncidentReport).filter(IncidentReport.reported_at >= datetime.utcnow() - timedelta(hours=48)).all() if math.sqrt((lat - inc.lat)**2 + (lng - inc.lng)**2) * 111000 <= 1000)
+    await incident_density.ensure_synced_async(db)
+    incident_count = incident_density.count(lat, lng, 1000, timedelta(hours=48))
     if incident_count >= 3: base_category = "High Danger"
     elif incident_count in [1, 2] and base_category == "Safe": base_category = "Danger"
 
@@ -251,43 +661,170 @@ async def evaluate_hybrid_safety(p_name: str, p_type: str, lat: float, lng: floa
         "night_category": night_category
     }
 
+async def run_place_analysis_inline(payload: dict):
+    # Fallback when the job queue is unreachable: same work, but inside this worker
+    try:
+        with metrics.job_duration.time(kind="place_analysis_inline"):
+            await generate_hybrid_smart_zones(payload["name"], payload["lat"], payload["lng"], payload["type"], payload["rating"], payload["fee"], place_id=payload.get("place_id"))
+    except Exception as e:
+        metrics.errors.inc(source="place_analysis_inline")
+        print(f"Hybrid AI Error: {e}")
+
 @app.post("/api/admin/places")
-async def add_place_with_wiki_ai(place: dict, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    lat = float(place.get('lat')) if place.get('lat') else None
-    lng = float(place.get('lng')) if place.get('lng') else None
-    
-    new_p = Place(
-        name=place.get('name', 'Unknown'), 
-        city=place.get('city', ''), 
-        img=place.get('img', ''), 
-        details=place.get('details', ''), 
-        lat=lat, lng=lng
-    )
+async def add_place_with_wiki_ai(place: dict, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    new_p = place_from_payload(place)
     db.add(new_p)
-    db.commit() 
+    await db.flush()
+    place_id, has_coords = new_p.id, bool(new_p.lat and new_p.lng)
+    await db.commit()
     
-    if lat and lng: 
-        p_type = place.get('type', 'tourist attraction')
-        p_rating = float(place.get('rating', 4.5))
-        p_fee = float(place.get('fee', 0.0))
-        
-        background_tasks.add_task(
-            generate_hybrid_smart_zones, 
-            place.get('name'), lat, lng, p_type, p_rating, p_fee
-        )
+    if has_coords: 
+        job = place_analysis_job(place_id, place)
+        try:
+            job_id, _ = await asyncio.to_thread(job_queue.submit, *job)
+        except Exception as e:
+            metrics.errors.inc(source="job_submit")
+            print(f"Job queue unavailable, analysing inline: {e}")
+            background_tasks.add_task(run_place_analysis_inline, job[1])
+            job_id = None
+        return {"message": "Place saved. Analyzing 10km radius for safety/danger zones...", "job_id": job_id}
         
     return {"message": "Place saved. Analyzing 10km radius for safety/danger zones..."}
 
-async def generate_hybrid_smart_zones(p_name: str, lat: float, lng: float, p_type: str, p_rating: float, p_fee: float):
-    db = SessionLocal()
-    headers = {"User-Agent": "RakshaSetu/1.0 (sunilpandab37@gmail.com)"}
+@app.post("/api/admin/places/bulk")
+def add_places_bulk(places: list[dict], background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    new_places = [place_from_payload(p) for p in places]
+    db.add_all(new_places)
+    db.flush()
+    saved = [(p.id, p.name, bool(p.lat and p.lng)) for p in new_places]
+    db.commit()
     
+    analysable = [(place_id, raw) for (place_id, _, has_coords), raw in zip(saved, places) if has_coords]
+    jobs = [place_analysis_job(place_id, raw) for place_id, raw in analysable]
     try:
-        # --- PHASE 1: MAIN SITE EVALUATION ---
-        main_eval = await evaluate_hybrid_safety(p_name, p_type, lat, lng, p_rating, p_fee, db)
+        job_ids = job_queue.submit_many(jobs) if jobs else []
+    except Exception as e:
+        metrics.errors.inc(source="job_submit")
+        print(f"Job queue unavailable, analysing {len(jobs)} places inline: {e}")
+        for job in jobs: background_tasks.add_task(run_place_analysis_inline, job[1])
+        job_ids = []
+    jobs_by_place = {place_id: job_id for (place_id, _), (job_id, _) in zip(analysable, job_ids)}
+    return [{"place_id": place_id, "name": name, "job_id": jobs_by_place.get(place_id)} for place_id, name, _ in saved]
+
+@app.post("/api/admin/places/import")
+async def import_places(request: Request, background_tasks: BackgroundTasks, batch_size: int = 500):
+    # Body is consumed as a stream (CSV with header, or JSONL) and inserted batch by batch
+    fmt = detect_format(content_type=request.headers.get("content-type", ""))
+    def analyse_inline(jobs):
+        for job in jobs: background_tasks.add_task(run_place_analysis_inline, job[1])
+    return await import_stream(request.stream(), fmt, job_queue.submit_many, batch_size, fallback=analyse_inline)
+
+@app.get("/api/admin/jobs/{job_id}")
+def get_job_status(job_id: str):
+    job = job_queue.status(job_id)
+    if not job: raise HTTPException(status_code=404)
+    return job
+
+@app.get("/api/admin/jobs")
+def get_job_statuses(ids: str):
+    job_ids = [i for i in ids.split(",") if i]
+    return [job or {"id": job_id, "status": "unknown"} for job_id, job in zip(job_ids, job_queue.statuses(job_ids))]
+
+AI_ZONE_SOURCES = ("HF-AI", "Wiki+HF AI")
+
+async def generate_hybrid_smart_zones(p_name: str, lat: float, lng: float, p_type: str, p_rating: float, p_fee: float, wiki: WikiGeoSearch = None, place_id: int = None):
+    db = AsyncSessionLocal()
+    
+    try:
+        # --- PHASE 1: MAIN SITE EVALUATION (runs while Wikipedia is scanned) ---
+        main_eval_task = asyncio.ensure_future(evaluate_hybrid_safety(p_name, p_type, lat, lng, p_rating, p_fee, db))
         
         # We shrink the main zone to 300m so it doesn't swallow the whole city
         main_radius = 300 
+
+        # THE MASTER TRACKER - Centers the anti-overlap math
+        master_zone_tracker = [{"lat": lat, "lng": lng, "radius": main_radius}]
+
+        # --- PHASE 2: WIKIPEDIA GEOSCAN (Radius increased to 10km) ---
+        try:
+            pages = await (wiki or wiki_search).geosearch(lat, lng, radius=10000, limit=100)
+        except Exception as e:
+            metrics.errors.inc(source="wiki_zone_scan")
+            print(f"Wikipedia API Error: {e}")
+            pages = {}
+        
+        danger_candidates = []
+        safe_candidates = []
+        
+        # Pre-sort the Wikipedia results based on keywords
+        for _, info in pages.items():
+            desc = info.get('description', '').lower()
+            title = info.get('title', '').lower()
+            coords = info.get('coordinates', [{}])[0]
+            p_lat, p_lng = coords.get('lat'), coords.get('lon')
+            
+            if p_lat is None or p_lng is None: continue
+
+            guessed_type = "landmark"
+            is_potential_danger = False
+            is_potential_safe = False
+            
+            danger_kws = ["forest", "isolated", "ruins", "cemetery", "abandoned", "wildlife", "valley", "lake", "park", "beach", "bar", "club", "liquor"]
+            safe_kws = ["temple", "shrine", "mosque", "church", "hospital", "police", "government", "institute", "university", "museum"]
+            
+            for w in danger_kws:
+                if w in desc or w in title:
+                    guessed_type = w
+                    is_potential_danger = True
+                    break
+            if not is_potential_danger:
+                for w in safe_kws:
+                    if w in desc or w in title:
+                        guessed_type = w
+                        is_potential_safe = True
+                        break
+
+            if is_potential_danger and len(danger_candidates) < 5:
+                danger_candidates.append({"info": info, "lat": p_lat, "lng": p_lng, "type": guessed_type})
+            elif is_potential_safe and len(safe_candidates) < 5:
+                safe_candidates.append({"info": info, "lat": p_lat, "lng": p_lng, "type": guessed_type})
+
+        # --- PHASE 3: PLACEMENT ---
+        # Overlap checks only depend on geometry, never on the AI verdict, so every
+        # accepted candidate is known before a single model call is made.
+        danger_zones = []
+        safe_zones = []
+        
+        # Priority 1: Danger Zones
+        for cand in danger_candidates:
+            if len(danger_zones) >= 3: break
+            
+            # Zero Overlap Check
+            tracked = PointSet([tz["lat"] for tz in master_zone_tracker], [tz["lng"] for tz in master_zone_tracker], [tz["radius"] for tz in master_zone_tracker])
+            if (tracked.distances(cand["lat"], cand["lng"]) < 400 + tracked.radii).any(): continue
+            
+            master_zone_tracker.append({"lat": cand["lat"], "lng": cand["lng"], "radius": 400})
+            danger_zones.append(cand)
+        
+        # Priority 2: Safe Zones (Dynamically Shrinking)
+        for cand in safe_candidates:
+            if len(safe_zones) >= 3: break
+            
+            # Shrink to the clearance left by the nearest tracked zone
+            tracked = PointSet([tz["lat"] for tz in master_zone_tracker], [tz["lng"] for tz in master_zone_tracker], [tz["radius"] for tz in master_zone_tracker])
+            proposed_radius = float(min(500, (tracked.distances(cand["lat"], cand["lng"]) - tracked.radii).min()))
+            if proposed_radius < 100: continue
+            
+            master_zone_tracker.append({"lat": cand["lat"], "lng": cand["lng"], "radius": proposed_radius})
+            safe_zones.append({**cand, "radius": proposed_radius})
+
+        # --- PHASE 4: WIKI AI AND HF AI FUSION (all candidates evaluated concurrently) ---
+        main_eval, *cand_evals = await asyncio.gather(
+            main_eval_task,
+            *[evaluate_hybrid_safety(c["info"].get('title'), c["type"], c["lat"], c["lng"], 3.5, 0.0, db) for c in danger_zones],
+            *[evaluate_hybrid_safety(c["info"].get('title'), c["type"], c["lat"], c["lng"], 4.5, 0.0, db) for c in safe_zones]
+        )
+        danger_evals, safe_evals = cand_evals[:len(danger_zones)], cand_evals[len(danger_zones):]
         
         # If the main zone is time-sensitive (e.g. Park), we add TWO records for day and night
         if main_eval["is_hybrid"]:
@@ -295,123 +832,47 @@ async def generate_hybrid_smart_zones(p_name: str, lat: float, lng: float, p_typ
             db.add(SafeZone(name=f"AI: {p_name} (Night)", lat=lat, lng=lng, radius=main_radius, category=main_eval["night_category"], active_from=dt_time(19, 0), active_to=dt_time(5, 0), source="HF-AI"))
         else:
             db.add(SafeZone(name=f"AI Analysis: {p_name}", lat=lat, lng=lng, radius=main_radius, category=main_eval["base_category"], source="HF-AI"))
-
-        # THE MASTER TRACKER - Centers the anti-overlap math
-        master_zone_tracker = [{"lat": lat, "lng": lng, "radius": main_radius}]
-
-        # --- PHASE 2: WIKIPEDIA GEOSCAN (Radius increased to 10km) ---
-        wiki_url = (
-            f"https://en.wikipedia.org/w/api.php?action=query&generator=geosearch"
-            f"&ggscoord={lat}|{lng}&ggsradius=10000&ggslimit=100&prop=description|coordinates&format=json"
-        )
-
-        async with httpx.AsyncClient(timeout=15.0, headers=headers) as client:
-            res = await client.get(wiki_url)
-            if res.status_code == 200:
-                pages = res.json().get('query', {}).get('pages', {})
-                
-                danger_candidates = []
-                safe_candidates = []
-                
-                # Pre-sort the Wikipedia results based on keywords
-                for _, info in pages.items():
-                    desc = info.get('description', '').lower()
-                    title = info.get('title', '').lower()
-                    coords = info.get('coordinates', [{}])[0]
-                    p_lat, p_lng = coords.get('lat'), coords.get('lon')
-                    
-                    if p_lat is None or p_lng is None: continue
-
-                    guessed_type = "landmark"
-                    is_potential_danger = False
-                    is_potential_safe = False
-                    
-                    danger_kws = ["forest", "isolated", "ruins", "cemetery", "abandoned", "wildlife", "valley", "lake", "park", "beach", "bar", "club", "liquor"]
-                    safe_kws = ["temple", "shrine", "mosque", "church", "hospital", "police", "government", "institute", "university", "museum"]
-                    
-                    for w in danger_kws:
-                        if w in desc or w in title:
-                            guessed_type = w
-                            is_potential_danger = True
-                            break
-                    if not is_potential_danger:
-                        for w in safe_kws:
-                            if w in desc or w in title:
-                                guessed_type = w
-                                is_potential_safe = True
-                                break
-
-                    if is_potential_danger and len(danger_candidates) < 5:
-                        danger_candidates.append({"info": info, "lat": p_lat, "lng": p_lng, "type": guessed_type})
-                    elif is_potential_safe and len(safe_candidates) < 5:
-                        safe_candidates.append({"info": info, "lat": p_lat, "lng": p_lng, "type": guessed_type})
-
-                # --- PHASE 3: WIKI AI AND HF AI FUSION (Processing Candidates) ---
-                danger_found = 0
-                safe_found = 0
-                
-                # Priority 1: Danger Zones
-                for cand in danger_candidates:
-                    if danger_found >= 3: break
-                    
-                    # Zero Overlap Check
-                    skip_danger = False
-                    for tz in master_zone_tracker:
-                        dist = math.sqrt((cand["lat"] - tz["lat"])**2 + (cand["lng"] - tz["lng"])**2) * 111000
-                        if dist < (400 + tz["radius"]):
-                            skip_danger = True 
-                            break 
-                    if skip_danger: continue
-                    
-                    # AI FUSION: Pass the Wiki Candidate to the Hugging Face AI to get Timings and Category
-                    eval_data = await evaluate_hybrid_safety(cand["info"].get('title'), cand["type"], cand["lat"], cand["lng"], 3.5, 0.0, db)
-                    
-                    if eval_data["is_hybrid"]:
-                        # Creates Day-Safe and Night-Danger zones
-                        db.add(SafeZone(name=f"Wiki-Safe (Day): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=400, category=eval_data["base_category"], active_from=dt_time(5, 0), active_to=dt_time(19, 0), source="Wiki+HF AI"))
-                        db.add(SafeZone(name=f"Wiki-Danger (Night): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=400, category=eval_data["night_category"], active_from=dt_time(19, 0), active_to=dt_time(5, 0), source="Wiki+HF AI"))
-                    else:
-                        final_cat = eval_data["base_category"] if eval_data["base_category"] != "Safe" else "Danger"
-                        db.add(SafeZone(name=f"Wiki-Danger: {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=400, category=final_cat, source="Wiki+HF AI"))
-                        
-                    master_zone_tracker.append({"lat": cand["lat"], "lng": cand["lng"], "radius": 400})
-                    danger_found += 1
-                
-                # Priority 2: Safe Zones (Dynamically Shrinking)
-                for cand in safe_candidates:
-                    if safe_found >= 3: break
-                    
-                    proposed_radius = 500 
-                    skip_safe = False
-                    
-                    for tz in master_zone_tracker:
-                        dist = math.sqrt((cand["lat"] - tz["lat"])**2 + (cand["lng"] - tz["lng"])**2) * 111000
-                        if dist < (proposed_radius + tz["radius"]):
-                            allowed_radius = dist - tz["radius"]
-                            proposed_radius = min(proposed_radius, allowed_radius)
-                            if proposed_radius < 100:
-                                skip_safe = True 
-                                break 
-                                
-                    if skip_safe: continue
-                    
-                    # AI FUSION: Pass Wiki Candidate to HF AI
-                    eval_data = await evaluate_hybrid_safety(cand["info"].get('title'), cand["type"], cand["lat"], cand["lng"], 4.5, 0.0, db)
-                    
-                    if eval_data["is_hybrid"]:
-                        db.add(SafeZone(name=f"Wiki-Safe (Day): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=proposed_radius, category=eval_data["base_category"], active_from=dt_time(5, 0), active_to=dt_time(19, 0), source="Wiki+HF AI"))
-                        db.add(SafeZone(name=f"Wiki-Danger (Night): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=proposed_radius, category=eval_data["night_category"], active_from=dt_time(19, 0), active_to=dt_time(5, 0), source="Wiki+HF AI"))
-                    else:
-                        db.add(SafeZone(name=f"Wiki-Safe: {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=proposed_radius, category=eval_data["base_category"], source="Wiki+HF AI"))
-                        
-                    master_zone_tracker.append({"lat": cand["lat"], "lng": cand["lng"], "radius": proposed_radius})
-                    safe_found += 1
-
-        db.commit()
-    except Exception as e:
-        print(f"Hybrid AI Error: {e}")
+        
+        for cand, eval_data in zip(danger_zones, danger_evals):
+            if eval_data["is_hybrid"]:
+                # Creates Day-Safe and Night-Danger zones
+                db.add(SafeZone(name=f"Wiki-Safe (Day): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=400, category=eval_data["base_category"], active_from=dt_time(5, 0), active_to=dt_time(19, 0), source="Wiki+HF AI"))
+                db.add(SafeZone(name=f"Wiki-Danger (Night): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=400, category=eval_data["night_category"], active_from=dt_time(19, 0), active_to=dt_time(5, 0), source="Wiki+HF AI"))
+            else:
+                final_cat = eval_data["base_category"] if eval_data["base_category"] != "Safe" else "Danger"
+                db.add(SafeZone(name=f"Wiki-Danger: {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=400, category=final_cat, source="Wiki+HF AI"))
+        
+        for cand, eval_data in zip(safe_zones, safe_evals):
+            if eval_data["is_hybrid"]:
+                db.add(SafeZone(name=f"Wiki-Safe (Day): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=cand["radius"], category=eval_data["base_category"], active_from=dt_time(5, 0), active_to=dt_time(19, 0), source="Wiki+HF AI"))
+                db.add(SafeZone(name=f"Wiki-Danger (Night): {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=cand["radius"], category=eval_data["night_category"], active_from=dt_time(19, 0), active_to=dt_time(5, 0), source="Wiki+HF AI"))
+            else:
+                db.add(SafeZone(name=f"Wiki-Safe: {cand['info'].get('title')}", lat=cand["lat"], lng=cand["lng"], radius=cand["radius"], category=eval_data["base_category"], source="Wiki+HF AI"))
+
+        new_zones = [o for o in db.new if isinstance(o, SafeZone)]
+        replaced = []
+        if place_id is not None:
+            for z in new_zones: z.place_id = place_id
+            # A re-analysis supersedes the place's earlier AI zones. Zones written before they were keyed
+            # by place are matched on the exact name and position this run produces for them.
+            stale = (SafeZone.source.in_(AI_ZONE_SOURCES)) & or_(
+                SafeZone.place_id == place_id,
+                and_(SafeZone.place_id.is_(None), or_(*[and_(SafeZone.name == z.name, SafeZone.lat == z.lat, SafeZone.lng == z.lng) for z in new_zones]))
+            )
+            replaced = list((await db.execute(select(SafeZone.id).where(stale))).scalars())
+            if replaced: await db.execute(delete(SafeZone).where(SafeZone.id.in_(replaced)))
+        await db.flush()
+        created = [events.zone_payload(z) for z in new_zones]
+        await db.commit()
+        # New zones are added as a batch, so just force the next lookup to rebuild
+        zone_index.invalidate()
+        publish_zone_changes([("zone.deleted", {"id": zone_id}) for zone_id in replaced] + [("zone.created", z) for z in created])
+    except Exception:
+        # Surface the error so the job queue can retry the analysis
+        await db.rollback()
+        raise
     finally:
-        db.close()
+        await db.close()
 
 @app.put("/api/admin/places/{place_id}")
 def update_place(place_id: int, place_data: dict, db: Session = Depends(get_db)):
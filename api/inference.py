@@ -0,0 +1,119 @@
+import asyncio
+import json
+from collections import OrderedDict
+import time
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING: import httpx
+
+from . import metrics
+
+HF_CATEGORIES = {0: "Safe", 1: "Danger", 2: "High Danger"}
+
+
+# --- HUGGING FACE (GRADIO) SAFETY MODEL CLIENT ---
+# The Space exposes Gradio's two-step API: POST /call/predict returns an event id, and
+# GET /call/predict/{event_id} is an SSE stream that ends with `event: complete`.
+# We read that stream instead of sleeping a fixed time, cap concurrent calls with a
+# semaphore, and memoize predictions - the model only sees (p_type, rating, fee).
+class HFPredictor:
+    def __init__(self, api_url: str, max_concurrency: int = 4, timeout: float = 10.0, max_entries: int = 2048,
+                 poll_attempts: int = 5, poll_backoff: float = 0.2,
+                 transport: Optional["httpx.AsyncBaseTransport"] = None):
+        self.api_url = api_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.poll_attempts = poll_attempts
+        self.poll_backoff = poll_backoff
+        self.transport = transport
+        self._memo: OrderedDict[tuple, int] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._client_loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def client(self) -> "httpx.AsyncClient":
+        # The pooled client and the semaphore are bound to the event loop they were first used on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # httpx is only imported once the first prediction is requested
+            import httpx
+            self._client = httpx.AsyncClient(timeout=self.timeout, transport=self.transport,
+                                             limits=httpx.Limits(max_connections=self.max_concurrency * 2, keepalive_expiry=60))
+            self._client_loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def predict(self, p_type: str, rating: float, fee: float) -> int:
+        """Raw model class (0 Safe, 1 Danger, 2 High Danger); raises on upstream failure."""
+        key = (p_type, float(rating), float(fee))
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            metrics.cache_requests.inc(cache="hf", result="hit")
+            return self._memo[key]
+        metrics.cache_requests.inc(cache="hf", result="miss")
+        self.client()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None)
+        return await asyncio.shield(task)
+
+    async def category(self, p_type: str, rating: float, fee: float, default: str = "Safe") -> str:
+        try:
+            return HF_CATEGORIES.get(await self.predict(p_type, rating, fee), default)
+        except Exception:
+            metrics.errors.inc(source="hf_predict")
+            return default
+
+    async def _call(self, key: tuple) -> int:
+        import httpx
+        client = self.client()
+        async with self._semaphore:
+            # Timed once a slot is free, so queueing behind the semaphore isn't blamed on the Space
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                res = await client.post(self.api_url, json={"data": list(key)})
+                res.raise_for_status()
+                event_id = res.json()["event_id"]
+                data = await self._result(client, event_id)
+                outcome = "ok"
+            except (httpx.TimeoutException, TimeoutError):
+                outcome = "timeout"
+                metrics.upstream_timeouts.inc(service="hf")
+                raise
+            finally:
+                metrics.upstream_duration.observe(time.perf_counter() - started, service="hf", outcome=outcome)
+        prediction = int(data[0])
+        self._memo[key] = prediction
+        while len(self._memo) > self.max_entries: self._memo.popitem(last=False)
+        return prediction
+
+    async def _result(self, client: "httpx.AsyncClient", event_id: str) -> list:
+        delay = self.poll_backoff
+        for _ in range(self.poll_attempts):
+            async with client.stream("GET", f"{self.api_url}/{event_id}") as res:
+                res.raise_for_status()
+                if res.headers.get("content-type", "").startswith("application/json"):
+                    return json.loads(await res.aread()).get("data", [0])
+                event = None
+                async for line in res.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:") and event == "complete":
+                        return json.loads(line[5:].strip())
+                    elif line.startswith("data:") and event == "error":
+                        raise RuntimeError(f"HF prediction failed: {line[5:].strip()}")
+            # Stream closed before the job completed (queue still busy); back off and re-attach
+            await asyncio.sleep(delay)
+            delay *= 2
+        raise TimeoutError(f"HF prediction {event_id} did not complete")
@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from .database import User
+
+
+# --- WRITE-BEHIND BUFFER FOR User.last_lat / last_lng ---
+# Single pings only need the latest position per user in the DB (Redis holds the live
+# copy), so writes are coalesced here and flushed as one bulk UPDATE. Requests flush when
+# the buffer is due; `on_due`, if given, is also called from a timer `flush_interval` seconds
+# after the first buffered ping, so a tourist's last position is written even if nobody pings again.
+class LocationWriteBuffer:
+    def __init__(self, flush_size: int = 200, flush_interval: float = 2.0, on_due: Optional[Callable] = None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.on_due = on_due
+        self._lock = threading.Lock()
+        # Serializes flushes, so an older drained batch can never commit after a newer one
+        self._flush_lock = threading.Lock()
+        self._pending: dict[int, tuple[float, float]] = {}
+        self._oldest = None
+        self._timer: Optional[threading.Timer] = None
+
+    def add(self, user_id: int, lat: float, lng: float):
+        with self._lock:
+            if not self._pending: self._oldest = time.monotonic()
+            self._pending[user_id] = (lat, lng)
+            self._schedule()
+
+    def _schedule(self):
+        # Called with self._lock held
+        if self.on_due is None or self._timer is not None: return
+        self._timer = threading.Timer(self.flush_interval, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock: self._timer = None
+        try:
+            self.on_due()
+        finally:
+            # A failed flush put its rows back; try again after another interval
+            with self._lock:
+                if self._pending: self._schedule()
+
+    def is_due(self) -> bool:
+        with self._lock:
+            if not self._pending: return False
+            return len(self._pending) >= self.flush_size or time.monotonic() - self._oldest >= self.flush_interval
+
+    def drain(self) -> dict[int, tuple[float, float]]:
+        with self._lock:
+            pending, self._pending, self._oldest = self._pending, {}, None
+        return pending
+
+    def flush(self, db: Session) -> int:
+        with self._flush_lock:
+            pending = self.drain()
+            if not pending: return 0
+            try:
+                bulk_update_positions(db, pending)
+            except Exception:
+                # Put the positions back unless a newer ping for the same user arrived meanwhile
+                with self._lock:
+                    for user_id, pos in pending.items(): self._pending.setdefault(user_id, pos)
+                    if self._oldest is None: self._oldest = time.monotonic()
+                raise
+            return len(pending)
+
+
+_POSITION_UPDATE = (
+    update(User.__table__)
+    .where(User.__table__.c.id == bindparam("uid"))
+    .values(last_lat=bindparam("lat"), last_lng=bindparam("lng"))
+)
+
+
+def bulk_update_positions(db: Session, positions: dict[int, tuple[float, float]]):
+    # Plain executemany rather than ORM bulk mappings: a user deleted since the ping
+    # matches no row and is skipped, instead of failing (and re-queuing) the whole batch
+    db.execute(_POSITION_UPDATE, [{"uid": uid, "lat": lat, "lng": lng} for uid, (lat, lng) in positions.items()])
+    db.commit()
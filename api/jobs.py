@@ -0,0 +1,152 @@
+import json
+import time
+import uuid
+from typing import Callable, Optional
+
+# --- DURABLE JOB QUEUE (Redis) ---
+# Ready job ids live in a list; a worker atomically moves one into the processing list
+# (BLMOVE), so a crashed worker never loses it. Failed jobs are parked in a sorted set
+# scored by their next run time (exponential backoff) until promoted back to the queue.
+QUEUE_KEY = "jobs:queue"
+PROCESSING_KEY = "jobs:processing"
+DELAYED_KEY = "jobs:delayed"
+JOB_KEY = "job:{}"
+IDEMPOTENCY_KEY = "job:idem:{}"
+JOB_RETENTION = 7 * 24 * 3600
+
+
+class JobQueue:
+    def __init__(self, redis: Callable, max_attempts: int = 5, backoff_base: float = 5.0, backoff_max: float = 600.0, lease: float = 900.0):
+        self.redis = redis
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+
+    def submit(self, kind: str, payload: dict, idempotency_key: Optional[str] = None) -> tuple[str, bool]:
+        """Enqueues a job and returns (job_id, created); an existing job is reused for the same key."""
+        return self.submit_many([(kind, payload, idempotency_key)])[0]
+
+    def submit_many(self, jobs: list[tuple[str, dict, Optional[str]]]) -> list[tuple[str, bool]]:
+        r = self.redis()
+        now = time.time()
+        ids = [uuid.uuid4().hex for _ in jobs]
+        # Claim idempotency keys first; a key that is already taken resolves to the existing job
+        pipe = r.pipeline(transaction=False)
+        for job_id, (_, _, key) in zip(ids, jobs):
+            if key: pipe.set(IDEMPOTENCY_KEY.format(key), job_id, nx=True, ex=JOB_RETENTION)
+        claimed = iter(pipe.execute())
+        existing_pipe = r.pipeline(transaction=False)
+        results, fresh = [], []
+        for job_id, (kind, payload, key) in zip(ids, jobs):
+            if key and not next(claimed):
+                existing_pipe.get(IDEMPOTENCY_KEY.format(key))
+                results.append(None)
+            else:
+                results.append((job_id, True))
+                fresh.append((job_id, kind, payload, key))
+        existing = iter(existing_pipe.execute()) if len(existing_pipe) else iter(())
+        results = [res if res is not None else (next(existing), False) for res in results]
+
+        pipe = r.pipeline(transaction=False)
+        for job_id, kind, payload, key in fresh:
+            pipe.hset(JOB_KEY.format(job_id), mapping={
+                "id": job_id, "kind": kind, "payload": json.dumps(payload), "status": "queued",
+                "attempts": 0, "idempotency_key": key or "", "created_at": now, "updated_at": now
+            })
+            pipe.expire(JOB_KEY.format(job_id), JOB_RETENTION)
+        if fresh: pipe.lpush(QUEUE_KEY, *[f[0] for f in fresh])
+        pipe.execute()
+        return results
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.redis().hgetall(JOB_KEY.format(job_id))
+        if not job: return None
+        job["payload"] = json.loads(job.get("payload") or "{}")
+        job["attempts"] = int(job.get("attempts", 0))
+        return job
+
+    def statuses(self, job_ids: list[str]) -> list[Optional[dict]]:
+        pipe = self.redis().pipeline(transaction=False)
+        for job_id in job_ids: pipe.hgetall(JOB_KEY.format(job_id))
+        return [
+            {**job, "payload": json.loads(job.get("payload") or "{}"), "attempts": int(job.get("attempts", 0))} if job else None
+            for job in pipe.execute()
+        ]
+
+    def promote_delayed(self, now: Optional[float] = None) -> int:
+        r = self.redis()
+        due = r.zrangebyscore(DELAYED_KEY, "-inf", now or time.time())
+        moved = 0
+        for job_id in due:
+            # ZREM is the claim, so two workers never both promote the same job
+            if r.zrem(DELAYED_KEY, job_id):
+                r.lpush(QUEUE_KEY, job_id)
+                moved += 1
+        return moved
+
+    def requeue_expired(self, now: Optional[float] = None) -> int:
+        """
+        Puts jobs back whose worker died mid-run (lease expired without complete/fail), or marks
+        them failed once they have used up max_attempts. Returns how many were requeued.
+        """
+        r = self.redis()
+        now = now or time.time()
+        requeued = 0
+        for job_id in r.lrange(PROCESSING_KEY, 0, -1):
+            key = JOB_KEY.format(job_id)
+            present, started, attempts = r.hmget(key, "id", "started_at", "attempts")
+            if not present:
+                # The job hash outlived its retention; nothing left to run
+                r.lrem(PROCESSING_KEY, 1, job_id)
+                continue
+            if not started:
+                # The worker died between BLMOVE and writing its lease; the first sweep to see the
+                # job starts the clock, so a worker that is merely slow still gets a full lease
+                r.hsetnx(key, "orphaned_at", now)
+                started = r.hget(key, "orphaned_at")
+            if now - float(started) <= self.lease or not r.lrem(PROCESSING_KEY, 1, job_id): continue
+            pipe = r.pipeline(transaction=False)
+            pipe.hdel(key, "started_at", "orphaned_at")
+            if int(attempts or 0) >= self.max_attempts:
+                pipe.hset(key, mapping={"status": "failed", "error": "lease expired", "updated_at": now})
+            else:
+                pipe.hset(key, mapping={"status": "queued", "updated_at": now})
+                pipe.lpush(QUEUE_KEY, job_id)
+                requeued += 1
+            pipe.execute()
+        return requeued
+
+    def reserve(self, timeout: float = 5.0) -> Optional[dict]:
+        """Blocks up to `timeout` seconds for the next job and marks it running."""
+        r = self.redis()
+        self.promote_delayed()
+        job_id = r.blmove(QUEUE_KEY, PROCESSING_KEY, timeout, "RIGHT", "LEFT")
+        if job_id is None: return None
+        now = time.time()
+        pipe = r.pipeline(transaction=False)
+        pipe.hincrby(JOB_KEY.format(job_id), "attempts", 1)
+        pipe.hset(JOB_KEY.format(job_id), mapping={"status": "running", "started_at": now, "updated_at": now})
+        pipe.hdel(JOB_KEY.format(job_id), "orphaned_at")
+        pipe.execute()
+        return self.status(job_id)
+
+    def complete(self, job: dict):
+        r = self.redis()
+        pipe = r.pipeline(transaction=False)
+        pipe.lrem(PROCESSING_KEY, 1, job["id"])
+        pipe.hset(JOB_KEY.format(job["id"]), mapping={"status": "done", "error": "", "updated_at": time.time()})
+        pipe.execute()
+
+    def fail(self, job: dict, error: str):
+        r = self.redis()
+        now = time.time()
+        pipe = r.pipeline(transaction=False)
+        pipe.lrem(PROCESSING_KEY, 1, job["id"])
+        if job["attempts"] < self.max_attempts:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (job["attempts"] - 1))
+            pipe.hset(JOB_KEY.format(job["id"]), mapping={"status": "retrying", "error": error, "next_run_at": now + delay, "updated_at": now})
+            pipe.zadd(DELAYED_KEY, {job["id"]: now + delay})
+        else:
+            pipe.hset(JOB_KEY.format(job["id"]), mapping={"status": "failed", "error": error, "updated_at": now})
+        pipe.execute()
@@ -0,0 +1,99 @@
+import time
+from typing import Optional
+
+from .events import pipeline_publish
+from .geo import distance_m
+
+# --- LIVE TOURIST POSITIONS (Redis GEO set + freshness sorted set) ---
+# `live:geo` holds each tourist's last position; `live:seen` scores every member with the
+# unix time of its last ping. A member counts as online while its last ping is younger
+# than LIVE_TTL, which replaces the per-user `live_loc:{username}` keys and their 60s TTL.
+LIVE_GEO_KEY = "live:geo"
+LIVE_SEEN_KEY = "live:seen"
+LIVE_TTL = 60
+# Lapsed members are kept a while longer so `changed_since` can still report them as offline
+PRUNE_AFTER = 10 * LIVE_TTL
+
+
+def queue_positions(pipe, positions: dict[str, tuple[float, float]], now: Optional[float] = None, publish: bool = True):
+    if not positions: return
+    now = now or time.time()
+    values = []
+    for username, (lat, lng) in positions.items(): values += [lng, lat, username]
+    pipe.geoadd(LIVE_GEO_KEY, values)
+    pipe.zadd(LIVE_SEEN_KEY, {username: now for username in positions})
+    if publish:
+        pipeline_publish(pipe, "tourist.positions", [{"username": u, "lat": lat, "lng": lng} for u, (lat, lng) in positions.items()])
+
+
+def record_positions(r, positions: dict[str, tuple[float, float]], now: Optional[float] = None, publish: bool = True):
+    if not positions: return
+    pipe = r.pipeline(transaction=False)
+    queue_positions(pipe, positions, now, publish)
+    pipe.execute()
+
+
+def remove(r, *usernames: str):
+    if not usernames: return
+    pipe = r.pipeline(transaction=False)
+    pipe.zrem(LIVE_GEO_KEY, *usernames)
+    pipe.zrem(LIVE_SEEN_KEY, *usernames)
+    pipeline_publish(pipe, "tourist.offline", list(usernames))
+    pipe.execute()
+
+
+def prune_stale(r, now: Optional[float] = None) -> int:
+    """Drops members whose last ping is older than PRUNE_AFTER from both sets."""
+    stale = r.zrangebyscore(LIVE_SEEN_KEY, "-inf", f"({(now or time.time()) - PRUNE_AFTER}")
+    if stale: remove(r, *stale)
+    return len(stale)
+
+
+def online_positions(r, now: Optional[float] = None) -> dict[str, tuple[float, float]]:
+    return positions(r, online_names(r, now))
+
+
+def online_names(r, now: Optional[float] = None) -> list[str]:
+    """Usernames whose last ping is younger than LIVE_TTL; only `live:seen` is read."""
+    return r.zrangebyscore(LIVE_SEEN_KEY, (now or time.time()) - LIVE_TTL, "+inf")
+
+
+def positions(r, usernames: list[str]) -> dict[str, tuple[float, float]]:
+    if not usernames: return {}
+    return {name: (c[1], c[0]) for name, c in zip(usernames, r.geopos(LIVE_GEO_KEY, *usernames)) if c}
+
+
+def online_in_box(r, min_lat: float, min_lng: float, max_lat: float, max_lng: float, now: Optional[float] = None) -> dict[str, tuple[float, float]]:
+    """Fresh positions inside a lat/lng box (a map viewport)."""
+    # GEOSEARCH on the circle through the box's corners (BYBOX boxes are metric, not lat/lng),
+    # then trimmed to the exact bounds; a few metres of slack cover GEO's ~0.6 m precision
+    c_lat, c_lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+    radius = max(distance_m(c_lat, c_lng, lat, lng) for lat in (min_lat, max_lat) for lng in (min_lng, max_lng)) * 1.001 + 5
+    hits = r.geosearch(LIVE_GEO_KEY, longitude=c_lng, latitude=c_lat, radius=radius, unit="m", withcoord=True)
+    inside = [(name, coord) for name, coord in hits if min_lat <= coord[1] <= max_lat and min_lng <= coord[0] <= max_lng]
+    if not inside: return {}
+    seen = r.zmscore(LIVE_SEEN_KEY, [name for name, _ in inside])
+    cutoff = (now or time.time()) - LIVE_TTL
+    return {name: (coord[1], coord[0]) for (name, coord), ts in zip(inside, seen) if ts is not None and ts >= cutoff}
+
+
+def changed_since(r, since: float, now: Optional[float] = None) -> tuple[dict[str, tuple[float, float]], list[str]]:
+    """Positions reported after `since`, plus members whose freshness lapsed after `since`."""
+    now = now or time.time()
+    cutoff = now - LIVE_TTL
+    moved = r.zrangebyscore(LIVE_SEEN_KEY, f"({max(since, cutoff)}", "+inf")
+    went_offline = r.zrangebyscore(LIVE_SEEN_KEY, f"({since - LIVE_TTL}", f"({cutoff}") if since - LIVE_TTL < cutoff else []
+    coords = r.geopos(LIVE_GEO_KEY, *moved) if moved else []
+    return {name: (c[1], c[0]) for name, c in zip(moved, coords) if c}, went_offline
+
+
+def tourists_within(r, lat: float, lng: float, radius_m: float, now: Optional[float] = None) -> list[dict]:
+    """Fresh positions within `radius_m` of a point, nearest first."""
+    hits = r.geosearch(LIVE_GEO_KEY, longitude=lng, latitude=lat, radius=radius_m, unit="m", sort="ASC", withdist=True, withcoord=True)
+    if not hits: return []
+    seen = r.zmscore(LIVE_SEEN_KEY, [h[0] for h in hits])
+    cutoff = (now or time.time()) - LIVE_TTL
+    return [
+        {"username": name, "lat": coord[1], "lng": coord[0], "distance_m": dist}
+        for (name, dist, coord), ts in zip(hits, seen) if ts is not None and ts >= cutoff
+    ]
@@ -0,0 +1,243 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# --- METRICS (Prometheus text exposition, no client library) ---
+# Counters and histograms live in this process and are rendered by /api/metrics (and by
+# `python -m api.worker --metrics-port`). Every serverless instance reports its own numbers;
+# Prometheus aggregates them across instances.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra: parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames): raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock: series = sorted(self._series.items())
+        for key, value in series: lines += self._render_series(key, value)
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock: self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, key, value) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None: series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the block's duration; an `outcome` label, if declared, is set to ok/error."""
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            if "outcome" in self.labelnames: labels["outcome"] = outcome
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def _render_series(self, key, value) -> list[str]:
+        counts, total, n = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts + [0]):
+            cumulative += count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {n if bound == float('inf') else cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+http_duration = REGISTRY.histogram("http_request_duration_seconds", "Request latency by route template", ("method", "route", "status"))
+db_queries_per_request = REGISTRY.histogram("db_queries_per_request", "SQL statements executed while serving one request", ("route",), COUNT_BUCKETS)
+db_time_per_request = REGISTRY.histogram("db_time_per_request_seconds", "Time spent in SQL statements while serving one request", ("route",))
+db_query_duration = REGISTRY.histogram("db_query_duration_seconds", "Latency of single SQL statements")
+db_errors = REGISTRY.counter("db_errors_total", "SQL statements that raised", ("error",))
+redis_duration = REGISTRY.histogram("redis_op_duration_seconds", "Latency of Redis operations, retries included", ("op",))
+redis_errors = REGISTRY.counter("redis_errors_total", "Redis operations that failed after the reconnect retry", ("op", "error"))
+redis_reconnects = REGISTRY.counter("redis_reconnects_total", "Stale Redis connections dropped and retried", ("op",))
+upstream_duration = REGISTRY.histogram("upstream_request_duration_seconds", "Latency of calls to external services", ("service", "outcome"))
+upstream_timeouts = REGISTRY.counter("upstream_timeouts_total", "External calls that timed out", ("service",))
+cache_requests = REGISTRY.counter("cache_requests_total", "Cache lookups by result (hit, stale, miss)", ("cache", "result"))
+job_duration = REGISTRY.histogram("job_duration_seconds", "Background job and housekeeping durations", ("kind", "outcome"), JOB_BUCKETS)
+errors = REGISTRY.counter("errors_total", "Handled errors that were previously only logged", ("source",))
+
+
+# --- PER-REQUEST DB ACCOUNTING ---
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Set by the middleware for the lifetime of one request; sync routes see it through the
+# threadpool's copied context and async sessions through SQLAlchemy's greenlet context
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+_instrumented = False
+
+
+def instrument_sqlalchemy():
+    """Times every statement on every Engine (sync and the async engine's sync core)."""
+    global _instrumented
+    if _instrumented: return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        db_query_duration.observe(elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    def failed(context):
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started: started.pop()
+        db_errors.inc(error=type(context.original_exception).__name__)
+
+    event.listen(Engine, "before_cursor_execute", before)
+    event.listen(Engine, "after_cursor_execute", after)
+    event.listen(Engine, "handle_error", failed)
+    _instrumented = True
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (so streaming responses pass through untouched) recording route latency and DB use."""
+
+    def __init__(self, app, exclude: tuple = ()):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start": status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            current_request.reset(token)
+            # The router stores the matched route in the scope; templates keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_duration.observe(time.perf_counter() - started, method=scope["method"], route=route, status=status)
+            db_queries_per_request.observe(stats.queries, route=route)
+            db_time_per_request.observe(stats.db_seconds, route=route)
+
+
+def start_http_server(port: int, host: str = "0.0.0.0"):
+    """Serves the registry on its own thread, for processes without an ASGI app (the worker)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
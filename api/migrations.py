@@ -0,0 +1,174 @@
+"""
+Versioned schema migrations. Run as a deploy step (never on import or cold start):
+
+    python -m api.migrations            # apply everything pending
+    python -m api.migrations --status   # list applied / pending versions
+
+Applied versions are recorded in `schema_version`. Each migration runs in its own
+transaction together with its version row, so a failed step can simply be re-run.
+Append new steps to MIGRATIONS; never edit or reorder one that has shipped.
+"""
+import argparse
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, LargeBinary, MetaData, String, Table, Text, Time, inspect, text
+
+from .database import get_engine
+
+# Arbitrary constant key for pg_advisory_lock, so two deploys never migrate at once
+LOCK_KEY = 72_114_001
+
+# The schema as the first release created it. Frozen here rather than taken from the models,
+# which keep moving: later columns and indexes belong to the steps that introduced them.
+BASELINE = MetaData()
+Table("users", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("username", String, unique=True, index=True),
+      Column("hashed_password", String),
+      Column("is_admin", Boolean),
+      Column("digital_id", String, unique=True),
+      Column("last_lat", Float, nullable=True),
+      Column("last_lng", Float, nullable=True))
+Table("places", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("name", String),
+      Column("city", String),
+      Column("img", String),
+      Column("details", Text),
+      Column("lat", Float, nullable=True),
+      Column("lng", Float, nullable=True))
+Table("safe_zones", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("name", String),
+      Column("lat", Float),
+      Column("lng", Float),
+      Column("radius", Float),
+      Column("category", String),
+      Column("active_from", Time, nullable=True),
+      Column("active_to", Time, nullable=True),
+      Column("expires_at", DateTime, nullable=True),
+      Column("source", String))
+Table("incident_reports", BASELINE,
+      Column("id", Integer, primary_key=True, index=True),
+      Column("username", String),
+      Column("lat", Float),
+      Column("lng", Float),
+      Column("reported_at", DateTime))
+
+
+def baseline(conn):
+    # Databases created by the old import-time create_all already have these; only missing tables are added
+    BASELINE.create_all(bind=conn, checkfirst=True)
+
+
+def legacy_columns(conn):
+    # Replaces migrate_schema's unconditional ALTERs: columns added after the first deploys
+    columns = {
+        "places": [("lat", "FLOAT"), ("lng", "FLOAT")],
+        "safe_zones": [("active_from", "TIME"), ("active_to", "TIME"), ("expires_at", "TIMESTAMP"), ("source", "VARCHAR DEFAULT 'Admin'")],
+    }
+    inspector = inspect(conn)
+    for table, wanted in columns.items():
+        have = {c["name"] for c in inspector.get_columns(table)}
+        for name, ddl in wanted:
+            if name not in have: conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def hot_query_indexes(conn):
+    # Nearby-places bounding box, incident density sync window, zone expiry filter/sweep
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_places_lat_lng ON places (lat, lng)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_incident_reports_reported_at ON incident_reports (reported_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_safe_zones_expires_at ON safe_zones (expires_at)"))
+
+
+# track_hours as step 4 shipped it; later changes to the TrackHour model need their own step
+TRACK_HOURS = Table("track_hours", MetaData(),
+                    Column("id", Integer, primary_key=True),
+                    Column("user_id", Integer, nullable=False),
+                    Column("hour", Integer, nullable=False),
+                    Column("samples", LargeBinary, nullable=False),
+                    Column("sample_count", Integer, nullable=False),
+                    Column("min_lat", Float),
+                    Column("max_lat", Float),
+                    Column("min_lng", Float),
+                    Column("max_lng", Float),
+                    Index("ix_track_hours_user_hour", "user_id", "hour", unique=True),
+                    Index("ix_track_hours_hour", "hour"))
+
+
+def track_hours(conn):
+    TRACK_HOURS.create(bind=conn, checkfirst=True)
+
+
+def zone_place_key(conn):
+    if "place_id" not in {c["name"] for c in inspect(conn).get_columns("safe_zones")}:
+        conn.execute(text("ALTER TABLE safe_zones ADD COLUMN place_id INTEGER"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_safe_zones_place_id ON safe_zones (place_id)"))
+
+
+MIGRATIONS: list[tuple[int, str, Callable]] = [
+    (1, "baseline tables", baseline),
+    (2, "legacy place/zone columns", legacy_columns),
+    (3, "hot query indexes", hot_query_indexes),
+    (4, "location history table", track_hours),
+    (5, "safe zone place key", zone_place_key),
+]
+
+
+def ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(conn) -> set[int]:
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def migrate(bind=None, target: int = None) -> list[int]:
+    """Applies pending migrations up to `target` (default: latest); returns the versions applied."""
+    bind = bind or get_engine()
+    is_postgres = bind.dialect.name == "postgresql"
+    done = []
+    with bind.connect() as lock_conn:
+        if is_postgres: lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": LOCK_KEY})
+        try:
+            with bind.begin() as conn:
+                ensure_version_table(conn)
+                applied = applied_versions(conn)
+            for version, name, step in MIGRATIONS:
+                if version in applied or (target is not None and version > target): continue
+                with bind.begin() as conn:
+                    step(conn)
+                    conn.execute(text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                                 {"v": version, "n": name, "t": datetime.utcnow()})
+                print(f"Applied migration {version}: {name}")
+                done.append(version)
+        finally:
+            if is_postgres: lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": LOCK_KEY})
+    return done
+
+
+def status(bind=None) -> list[tuple[int, str, bool]]:
+    bind = bind or get_engine()
+    with bind.begin() as conn:
+        ensure_version_table(conn)
+        applied = applied_versions(conn)
+    return [(version, name, version in applied) for version, name, _ in MIGRATIONS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations.")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations without applying")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    args = parser.parse_args(argv)
+    if args.status:
+        for version, name, applied in status():
+            print(f"{version:>4}  {'applied' if applied else 'pending':<8} {name}")
+        return
+    if not migrate(target=args.target): print("Schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
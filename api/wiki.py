@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING: import httpx
+
+from . import metrics
+from .geo import geohash_encode, geohash_center
+
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+WIKI_HEADERS = {"User-Agent": "RakshaSetu/1.0 (sunilpandab37@gmail.com)"}
+
+
+# --- CACHED WIKIPEDIA GEOSEARCH ---
+# Lookups are snapped to the centre of a geohash cell, so every request from the same
+# neighbourhood shares one cache entry (in-process LRU first, then Redis). Entries are
+# fresh for `ttl` seconds and may be served stale for another `stale_ttl` seconds while a
+# single background refresh runs. Concurrent misses for the same key share one upstream call.
+class WikiGeoSearch:
+    def __init__(self, redis: Optional[Callable] = None, ttl: float = 6 * 3600, stale_ttl: float = 24 * 3600,
+                 max_entries: int = 1024, precision: int = 6, timeout: float = 10.0,
+                 transport: Optional["httpx.AsyncBaseTransport"] = None):
+        self.redis = redis
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self.timeout = timeout
+        self.transport = transport
+        self._cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._client_loop = None
+
+    def client(self) -> "httpx.AsyncClient":
+        # A pooled client is bound to the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Imported here so cold starts that never call upstream skip httpx entirely
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout, headers=WIKI_HEADERS, transport=self.transport,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+            )
+            self._client_loop = loop
+            self._inflight = {}
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def cache_key(self, lat: float, lng: float, radius: int, limit: int) -> str:
+        return f"wiki:geo:{geohash_encode(lat, lng, self.precision)}:{radius}:{limit}"
+
+    async def geosearch(self, lat: float, lng: float, radius: int = 10000, limit: int = 20) -> dict:
+        """Wikipedia `generator=geosearch` pages (with description and coordinates) near a point."""
+        key = self.cache_key(lat, lng, radius, limit)
+        entry = self._cache_get(key) or await self._redis_get(key)
+        if entry:
+            fetched_at, pages = entry
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                metrics.cache_requests.inc(cache="wiki", result="hit")
+                return pages
+            if age < self.ttl + self.stale_ttl:
+                metrics.cache_requests.inc(cache="wiki", result="stale")
+                self._refresh(key, radius, limit)
+                return pages
+        metrics.cache_requests.inc(cache="wiki", result="miss")
+        return await self._refresh(key, radius, limit)
+
+    def _refresh(self, key: str, radius: int, limit: int) -> asyncio.Task:
+        self.client()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, radius, limit))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None)
+            # Background refreshes nobody awaits must not log "exception never retrieved"
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fetch(self, key: str, radius: int, limit: int) -> dict:
+        c_lat, c_lng = geohash_center(key.split(":")[2])
+        params = {
+            "action": "query", "generator": "geosearch", "ggscoord": f"{c_lat}|{c_lng}",
+            "ggsradius": radius, "ggslimit": limit, "prop": "description|coordinates", "format": "json"
+        }
+        pages = await self._get_pages(params)
+        entry = (time.time(), pages)
+        self._cache_put(key, entry)
+        await self._redis_put(key, entry)
+        return pages
+
+    async def _get_pages(self, params: dict) -> dict:
+        import httpx
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            res = await self.client().get(WIKI_API_URL, params=params)
+            res.raise_for_status()
+            pages = res.json().get('query', {}).get('pages', {})
+            outcome = "ok"
+            return pages
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            metrics.upstream_timeouts.inc(service="wikipedia")
+            raise
+        finally:
+            metrics.upstream_duration.observe(time.perf_counter() - started, service="wikipedia", outcome=outcome)
+
+    def _cache_get(self, key: str):
+        entry = self._cache.get(key)
+        if entry is not None: self._cache.move_to_end(key)
+        return entry
+
+    def _cache_put(self, key: str, entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries: self._cache.popitem(last=False)
+
+    async def _redis_get(self, key: str):
+        if self.redis is None: return None
+        try:
+            raw = await asyncio.to_thread(self.redis().get, key)
+        except Exception as e:
+            metrics.redis_errors.inc(op="wiki_cache_get", error=type(e).__name__)
+            return None
+        if not raw: return None
+        data = json.loads(raw)
+        entry = (data["at"], data["pages"])
+        self._cache_put(key, entry)
+        return entry
+
+    async def _redis_put(self, key: str, entry):
+        if self.redis is None: return
+        payload = json.dumps({"at": entry[0], "pages": entry[1]})
+        try:
+            await asyncio.to_thread(self.redis().setex, key, int(self.ttl + self.stale_ttl), payload)
+        except Exception as e:
+            metrics.redis_errors.inc(op="wiki_cache_put", error=type(e).__name__)
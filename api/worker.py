@@ -0,0 +1,108 @@
+"""
+Background worker for the place-analysis job queue.
+
+    python -m api.worker --concurrency 4
+    python -m api.worker --metrics-port 9100   # Prometheus metrics (job durations etc.) on :9100
+
+Run as many worker processes as needed; they share the Redis queue.
+"""
+import argparse
+import asyncio
+import time
+import traceback
+
+from . import metrics
+from .database import SessionLocal
+from .index import job_queue, generate_hybrid_smart_zones, sweep_expired_zones, compact_location_history
+
+
+async def run_place_analysis(payload: dict):
+    await generate_hybrid_smart_zones(payload["name"], payload["lat"], payload["lng"], payload["type"], payload["rating"], payload["fee"], place_id=payload.get("place_id"))
+
+
+HANDLERS = {
+    "place_analysis": run_place_analysis,
+}
+
+
+async def work(worker_id: int, stop: asyncio.Event, poll_timeout: float):
+    while not stop.is_set():
+        try:
+            job = await asyncio.to_thread(job_queue.reserve, poll_timeout)
+        except Exception as e:
+            metrics.errors.inc(source="job_reserve")
+            print(f"[worker {worker_id}] queue error: {e}")
+            await asyncio.sleep(poll_timeout)
+            continue
+        if job is None: continue
+
+        started = time.monotonic()
+        try:
+            handler = HANDLERS[job["kind"]]
+            await handler(job["payload"])
+        except Exception as e:
+            traceback.print_exc()
+            metrics.job_duration.observe(time.monotonic() - started, kind=job["kind"], outcome="error")
+            await asyncio.to_thread(job_queue.fail, job, f"{type(e).__name__}: {e}")
+            print(f"[worker {worker_id}] job {job['id']} failed (attempt {job['attempts']})")
+        else:
+            metrics.job_duration.observe(time.monotonic() - started, kind=job["kind"], outcome="ok")
+            await asyncio.to_thread(job_queue.complete, job)
+            print(f"[worker {worker_id}] job {job['id']} done in {time.monotonic() - started:.1f}s")
+
+
+def sweep_zones():
+    db = SessionLocal()
+    try:
+        with metrics.job_duration.time(kind="zone_sweep"):
+            purged = sweep_expired_zones(db)
+        if purged: print(f"[worker] purged {len(purged)} expired zones")
+    finally:
+        db.close()
+
+
+def compact_history():
+    db = SessionLocal()
+    try:
+        with metrics.job_duration.time(kind="history_compaction"):
+            stats = compact_location_history(db)
+        if stats and stats["hours"]: print(f"[worker] compacted {stats['hours']} hours of location history ({stats['samples_in']} -> {stats['samples_out']} samples)")
+    finally:
+        db.close()
+
+
+async def housekeeping(stop: asyncio.Event, interval: float):
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(job_queue.promote_delayed)
+            await asyncio.to_thread(job_queue.requeue_expired)
+            await asyncio.to_thread(sweep_zones)
+            await asyncio.to_thread(compact_history)
+        except Exception as e:
+            metrics.errors.inc(source="housekeeping")
+            print(f"[worker] housekeeping error: {e}")
+        try: await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError: pass
+
+
+async def main(concurrency: int, poll_timeout: float):
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(work(i, stop, poll_timeout)) for i in range(concurrency)]
+    tasks.append(asyncio.create_task(housekeeping(stop, 30.0)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        stop.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued place-analysis jobs.")
+    parser.add_argument("--concurrency", type=int, default=4, help="jobs processed in parallel by this process")
+    parser.add_argument("--poll-timeout", type=float, default=5.0, help="seconds to block waiting for a job")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    args = parser.parse_args()
+    if args.metrics_port: metrics.start_http_server(args.metrics_port)
+    try:
+        asyncio.run(main(args.concurrency, args.poll_timeout))
+    except KeyboardInterrupt:
+        pass
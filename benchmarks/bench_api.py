@@ -0,0 +1,285 @@
+"""
+End-to-end latency and throughput of the hot API routes at growing data sizes.
+
+    python -m benchmarks.bench_api                                  # SQLite + fakeredis, default scales
+    python -m benchmarks.bench_api --scales 1000 10000 50000 --out results.json
+    python -m benchmarks.bench_api --compare results.json --tolerance 0.25   # exit 1 on a p50/p99 regression
+    DATABASE_URL=postgresql://.../scratch REDIS_URL=redis://.../15 python -m benchmarks.bench_api --wipe
+
+Every scale runs in a fresh interpreter against freshly seeded synthetic data: N tourists
+(--online of them with a live position) plus safe zones, places and recent SOS incidents in
+proportion to N (see RATIOS). Wikipedia is stubbed with --wiki-hits pages
+answered after --upstream-ms, so explore-google also exercises the local-places fallback.
+Requests go through the ASGI app in-process (no network), with tokens for the write routes.
+
+With DATABASE_URL / REDIS_URL set, the target database is emptied before seeding, so --wipe
+is required; point them at scratch instances. Results are written as JSON with --out and can
+be diffed against an earlier file with --compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CENTER = (11.41, 76.70)
+SPREAD_DEG = 0.5
+# Rows seeded per tourist at each scale
+RATIOS = {"zones": 0.05, "places": 0.5, "incidents": 0.02}
+ENDPOINTS = ("update-location", "admin/tourists", "admin/tourists/online", "admin/safe-zones", "explore-google", "sos")
+
+
+class StubWiki:
+    """Answers every geosearch with `hits` tourist-keyword pages around the query point after `latency` s."""
+
+    def __init__(self, hits: int, latency: float):
+        self.hits = hits
+        self.latency = latency
+
+    async def geosearch(self, lat, lng, radius=10000, limit=20):
+        await asyncio.sleep(self.latency)
+        return {str(i): {"title": f"Bench Temple {i}", "description": "hindu temple",
+                         "coordinates": [{"lat": lat + 0.001 * (i + 1), "lon": lng}]} for i in range(min(self.hits, limit))}
+
+    async def aclose(self): pass
+
+
+def random_point(rng):
+    return CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+
+
+def wipe(r):
+    from api.database import Base, get_engine
+    with get_engine().begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables): conn.execute(table.delete())
+    r.flushdb()
+
+
+def seed(scale: int, online: float, r, rng) -> tuple[list[tuple[int, str]], dict]:
+    """Inserts the synthetic data set; returns (id, username) of every tourist and the live positions."""
+    from api.database import SessionLocal, User, SafeZone, Place, IncidentReport
+    db = SessionLocal()
+    now = datetime.utcnow()
+
+    def insert(model, rows):
+        for start in range(0, len(rows), 5000):
+            db.bulk_insert_mappings(model, rows[start:start + 5000])
+            db.commit()
+
+    try:
+        users = []
+        for i in range(scale):
+            lat, lng = random_point(rng)
+            users.append({"username": f"tourist{i}", "hashed_password": "x", "digital_id": f"DID_BENCH{i}",
+                          "is_admin": False, "last_lat": lat, "last_lng": lng})
+        insert(User, users)
+        zones = []
+        for i in range(int(scale * RATIOS["zones"])):
+            lat, lng = random_point(rng)
+            # A quarter are crowdsourced SOS zones with an expiry, like production
+            expires = now + timedelta(hours=rng.uniform(1, 6)) if i % 4 == 0 else None
+            zones.append({"name": f"Zone {i}", "lat": lat, "lng": lng, "radius": rng.choice([200, 300, 400, 800]),
+                          "category": rng.choice(["Safe", "Danger", "High Danger"]), "expires_at": expires,
+                          "source": "UserSOS" if expires else "Admin"})
+        insert(SafeZone, zones)
+        places = []
+        for i in range(int(scale * RATIOS["places"])):
+            lat, lng = random_point(rng)
+            places.append({"name": f"Place {i}", "city": "Bench", "img": "", "details": "", "lat": lat, "lng": lng})
+        insert(Place, places)
+        incidents = []
+        for i in range(int(scale * RATIOS["incidents"])):
+            lat, lng = random_point(rng)
+            incidents.append({"username": f"tourist{i}", "lat": lat, "lng": lng, "reported_at": now - timedelta(hours=rng.uniform(0, 47))})
+        insert(IncidentReport, incidents)
+        tourists = [(user_id, username) for user_id, username in db.query(User.id, User.username).order_by(User.id)]
+    finally:
+        db.close()
+
+    positions = {name: random_point(rng) for _, name in rng.sample(tourists, int(len(tourists) * online))}
+    refresh_live(r, positions)
+    return tourists, positions
+
+
+def refresh_live(r, positions: dict):
+    # Re-stamps the online tourists, which would otherwise go offline during long runs
+    from api import live
+    names = list(positions)
+    for start in range(0, len(names), 5000):
+        live.record_positions(r, {name: positions[name] for name in names[start:start + 5000]}, publish=False)
+
+
+def requests_for(endpoint: str, tourists, tokens, rng):
+    """Endless (method, path, kwargs) generator for one endpoint."""
+    while True:
+        lat, lng = random_point(rng)
+        if endpoint in ("update-location", "sos"):
+            user_id, username = rng.choice(tourists)
+            path = "/api/update-location" if endpoint == "update-location" else "/api/tourist/sos"
+            yield "POST", path, {"json": {"lat": lat, "lng": lng}, "headers": {"Authorization": f"Bearer {tokens[user_id]}"}}
+        elif endpoint in ("admin/tourists", "admin/tourists/online"):
+            yield "GET", f"/api/{endpoint}", {}
+        elif endpoint == "admin/safe-zones":
+            yield "GET", "/api/admin/safe-zones", {}
+        else:
+            yield "GET", "/api/tourist/explore-google", {"params": {"lat": lat, "lng": lng}}
+
+
+async def load(client, requests, concurrency: int, total: int) -> dict:
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, path, kwargs = next(requests)
+            t0 = time.perf_counter()
+            res = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            if res.status_code != 200: errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+        "errors": errors,
+    }
+
+
+async def run_scale(args) -> list[dict]:
+    import httpx
+    import redis
+    from api import index as idx
+    from api.migrations import migrate
+
+    url = os.environ.get("KV_URL") or os.environ.get("REDIS_URL")
+    if url:
+        idx.r, idx._raw_redis = redis.from_url(url, decode_responses=True), redis.from_url(url)
+    else:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        idx.r, idx._raw_redis = fakeredis.FakeRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server)
+    idx.wiki_search = StubWiki(args.wiki_hits, args.upstream_ms / 1000)
+    migrate()
+    wipe(idx.r)
+    rng = random.Random(args.seed)
+    t0 = time.perf_counter()
+    tourists, online = seed(args.worker_scale, args.online, idx.r, rng)
+    print(f"  seeded {args.worker_scale} tourists in {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+    tokens = {user_id: idx.token_verifier.issue(name, user_id, False) for user_id, name in tourists}
+
+    results = []
+    transport = httpx.ASGITransport(app=idx.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for endpoint in args.endpoints:
+            refresh_live(idx.r, online)
+            requests = requests_for(endpoint, tourists, tokens, rng)
+            await load(client, requests, 2, args.warmup)
+            for concurrency in args.concurrency:
+                res = await load(client, requests, concurrency, args.requests)
+                results.append({"endpoint": endpoint, "scale": args.worker_scale, "concurrency": concurrency, "requests": args.requests, **res})
+    # Leave nothing buffered behind for the next scale's wipe
+    idx.flush_location_buffer()
+    from api.database import get_async_engine
+    await get_async_engine().dispose()
+    return results
+
+
+def run_child(scale: int, argv: list[str], db_dir: Path) -> list[dict]:
+    env = dict(os.environ)
+    if "DATABASE_URL" not in env: env["DATABASE_URL"] = f"sqlite:///{db_dir / f'bench_{scale}.db'}"
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_api", *argv, "--worker-scale", str(scale)],
+                         cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    """Lines describing every p50/p99 that got worse than the baseline by more than `tolerance`."""
+    baseline = {(b["endpoint"], b["scale"], b["concurrency"]): b for b in json.loads(Path(baseline_path).read_text())["results"]}
+    regressions = []
+    print(f"\nvs {baseline_path}")
+    print(f"{'endpoint':<22} {'scale':>7} {'conc':>5} {'p50':>8} {'p99':>8} {'req/s':>8}")
+    for res in results:
+        base = baseline.get((res["endpoint"], res["scale"], res["concurrency"]))
+        if base is None: continue
+        ratios = {key: res[key] / base[key] if base[key] else 1.0 for key in ("p50_ms", "p99_ms", "rps")}
+        print(f"{res['endpoint']:<22} {res['scale']:>7} {res['concurrency']:>5} {ratios['p50_ms']:>7.2f}x {ratios['p99_ms']:>7.2f}x {ratios['rps']:>7.2f}x")
+        for key in ("p50_ms", "p99_ms"):
+            if ratios[key] > 1 + tolerance:
+                regressions.append(f"{res['endpoint']} scale={res['scale']} conc={res['concurrency']}: {key} {base[key]:.1f} -> {res[key]:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000], help="tourists per run")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--online", type=float, default=0.1, help="fraction of tourists with a live position")
+    parser.add_argument("--wiki-hits", type=int, default=3, help="stubbed Wikipedia pages per search (<5 triggers the DB fallback)")
+    parser.add_argument("--upstream-ms", type=float, default=20.0, help="stubbed Wikipedia latency")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--wipe", action="store_true", help="allow emptying DATABASE_URL / REDIS_URL before seeding")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="earlier --out file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50/p99 slowdown vs --compare")
+    parser.add_argument("--worker-scale", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_scale is not None:
+        print(json.dumps(asyncio.run(run_scale(args))))
+        return
+
+    external = [name for name in ("DATABASE_URL", "KV_URL", "REDIS_URL") if os.environ.get(name)]
+    if external and not args.wipe:
+        parser.error(f"{', '.join(external)} set: every scale empties it first, pass --wipe to confirm")
+
+    argv = list(sys.argv[1:])
+    for flag in ("--out", "--compare"):
+        if flag in argv: del argv[argv.index(flag):argv.index(flag) + 2]
+    db_dir = Path(tempfile.mkdtemp())
+    results = []
+    print(f"{'endpoint':<22} {'scale':>7} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for scale in sorted(args.scales):
+        for res in run_child(scale, argv, db_dir):
+            results.append(res)
+            print(f"{res['endpoint']:<22} {res['scale']:>7} {res['concurrency']:>5} {res['rps']:>8.1f} {res['p50_ms']:>8.1f} {res['p99_ms']:>8.1f} {res['errors']:>7}")
+
+    if args.out:
+        meta = {"commit": git_commit(), "created_at": datetime.utcnow().isoformat() + "Z", "python": platform.python_version(),
+                "database": os.environ.get("DATABASE_URL", "sqlite").split(":")[0], "redis": "external" if external else "fakeredis",
+                "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "worker_scale", "wipe")}}
+        Path(args.out).write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print("\nregressions beyond tolerance:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
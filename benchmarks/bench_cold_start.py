@@ -0,0 +1,118 @@
+"""
+Cold start of the API function: fresh interpreter -> `import api.index` -> first
+POST /api/update-location (the route phones hit right after a deploy).
+
+    eager+create_all  old import: Redis/HTTP/JWT/bcrypt set up eagerly, plus `create_all`
+    eager             same clients built eagerly, schema left to `python -m api.migrations`
+    lazy              current import: clients, engine and bcrypt context built on first use
+
+    python -m benchmarks.bench_cold_start                    # throwaway SQLite file
+    DATABASE_URL=postgresql://... REDIS_URL=... python -m benchmarks.bench_cold_start --runs 10
+    python -m benchmarks.bench_cold_start --budget-ms 1500   # exit 1 if lazy exceeds the budget
+
+Round trips against a remote Postgres are where create_all really hurts; SQLite only shows
+the introspection overhead itself. Without REDIS_URL a fakeredis TCP server stands in, so
+the children still talk real RESP over a socket. See benchmarks/profile_imports.py for
+where the import time goes.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from sqlalchemy import Engine, event
+statements = []
+event.listen(Engine, "before_cursor_execute", lambda conn, cur, stmt, *a: statements.append(stmt))
+import api.index as idx
+if MODE.startswith("eager"):
+    import httpx, redis.asyncio, jose.jwt
+    from api.database import Base, get_engine, get_pwd_context
+    idx.get_redis(); get_pwd_context(); get_engine()
+    if MODE == "eager+create_all": Base.metadata.create_all(bind=get_engine())
+t_import = time.perf_counter()
+import_statements = len(statements)
+# Driven as a bare ASGI call: TestClient would import httpx and skew the lazy numbers
+import asyncio
+async def post(path, body):
+    sent, pending = [], [{"type": "http.request", "body": body, "more_body": False}]
+    async def receive(): return pending.pop() if pending else {"type": "http.disconnect"}
+    async def send(message): sent.append(message)
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "client": ("127.0.0.1", 1),
+             "server": ("bench", 80), "headers": [(b"host", b"bench"), (b"content-type", b"application/json")]}
+    await idx.app(scope, receive, send)
+    return sent[0]["status"]
+status = asyncio.run(post("/api/update-location", json.dumps({"username": "bench", "lat": 11.41, "lng": 76.70}).encode()))
+t_first = time.perf_counter()
+print(json.dumps({"import_ms": (t_import - t0) * 1e3, "first_response_ms": (t_first - t0) * 1e3,
+                  "import_round_trips": import_statements, "status": status}))
+"""
+
+MODES = ("eager+create_all", "eager", "lazy")
+
+
+def run_child(mode: str) -> dict:
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", f"MODE = {mode!r}\n{CHILD}"], cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1e3
+    if result["status"] != 200: raise RuntimeError(f"{mode}: first request returned {result['status']}")
+    return result
+
+
+def seed_user():
+    from api.database import SessionLocal, User
+    db = SessionLocal()
+    try:
+        if not db.query(User).filter(User.username == "bench").first():
+            db.add(User(username="bench", hashed_password="x", digital_id="DID_BENCH"))
+            db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15, help="fresh processes per mode")
+    parser.add_argument("--budget-ms", type=float, help="fail if the lazy mode's median time to first response exceeds this")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}"
+    from api.migrations import migrate
+    migrate()
+    seed_user()
+    if not (os.environ.get("KV_URL") or os.environ.get("REDIS_URL")):
+        from fakeredis import TcpFakeServer
+        server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["REDIS_URL"] = f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+    print(f"{args.runs} cold starts per mode (medians)")
+    print(f"{'mode':>17} {'import ms':>10} {'1st resp ms':>12} {'process ms':>11} {'DB trips':>9}")
+    medians = {}
+    for mode in MODES:
+        runs = [run_child(mode) for _ in range(args.runs)]
+        med = lambda key: statistics.median(r[key] for r in runs)
+        medians[mode] = med("first_response_ms")
+        print(f"{mode:>17} {med('import_ms'):>10.1f} {med('first_response_ms'):>12.1f} {med('process_ms'):>11.1f} {runs[0]['import_round_trips']:>9}")
+
+    if args.budget_ms is not None and medians["lazy"] > args.budget_ms:
+        print(f"time to first response {medians['lazy']:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
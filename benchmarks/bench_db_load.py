@@ -0,0 +1,148 @@
+"""
+Concurrent request capacity of GET /api/tourist/explore-google with the DB fallback on the
+async engine vs. the old path (sync Session queried inside the `async def` route).
+
+    python -m benchmarks.bench_db_load                       # throwaway SQLite file
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_db_load --places 0
+    DB_POOL_MODE=null DATABASE_URL=... python -m benchmarks.bench_db_load
+
+Redis is replaced by fakeredis and Wikipedia by a stub that answers after --upstream-ms with
+no hits, so every request takes the nearest-places fallback. Needs `fakeredis`.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CENTER = (11.41, 76.70)
+SPREAD_DEG = 2.0
+
+
+class SlowEmptyWiki:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def geosearch(self, lat, lng, radius=10000, limit=20):
+        await asyncio.sleep(self.latency)
+        return {}
+
+    async def aclose(self): pass
+
+
+def seed_places(n: int):
+    from api.database import SessionLocal, Place
+    rng = random.Random(7)
+    db = SessionLocal()
+    try:
+        if db.query(Place.id).count() >= n: return
+        for start in range(0, n, 5000):
+            db.bulk_insert_mappings(Place, [
+                {"name": f"Place {i}", "city": "Bench", "img": "", "details": "",
+                 "lat": CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), "lng": CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)}
+                for i in range(start, min(n, start + 5000))
+            ])
+            db.commit()
+    finally:
+        db.close()
+
+
+def add_sync_baseline_route(idx):
+    """The pre-async route: same work, but the DB fallback runs on a sync Session in the event loop."""
+    from fastapi import Depends
+    from sqlalchemy.orm import Session
+    from api.database import Place
+    from api.geo import PointSet, bounding_box
+
+    def nearest_places_sync(db, lat, lng, k, radii=(10_000, 50_000, 250_000, None)):
+        rows = []
+        for radius in radii:
+            query = db.query(Place).filter(Place.lat.isnot(None), Place.lng.isnot(None))
+            if radius is not None:
+                min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius)
+                query = query.filter(Place.lat.between(min_lat, max_lat), Place.lng.between(min_lng, max_lng))
+            rows = query.all()
+            if len(rows) >= k: break
+        return PointSet.from_objects(rows).nearest(lat, lng, k)
+
+    @idx.app.get("/bench/explore-sync")
+    async def explore_sync(lat: float, lng: float, db: Session = Depends(idx.get_db)):
+        await idx.wiki_search.geosearch(lat, lng, radius=10000, limit=20)
+        return [{"id": f"db_{p.id}", "name": p.name, "distance": d / 1000} for p, d in nearest_places_sync(db, lat, lng, 10)]
+
+
+async def load(client, path: str, concurrency: int, total: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    points = [(CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)) for _ in range(total)]
+    queue = iter(points)
+    latencies, errors = [], 0
+
+    async def user():
+        nonlocal errors
+        for lat, lng in queue:
+            t0 = time.perf_counter()
+            res = await client.get(path, params={"lat": lat, "lng": lng})
+            latencies.append(time.perf_counter() - t0)
+            if res.status_code != 200: errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[user() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+        "errors": errors,
+    }
+
+
+async def run(args):
+    import fakeredis
+    import httpx
+    from api import index as idx
+    from api.migrations import migrate
+
+    migrate()
+    idx.r = fakeredis.FakeRedis(decode_responses=True)
+    idx.wiki_search = SlowEmptyWiki(args.upstream_ms / 1000)
+    add_sync_baseline_route(idx)
+    if args.places: seed_places(args.places)
+
+    transport = httpx.ASGITransport(app=idx.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Warm both pools and the OS page cache before measuring
+        await load(client, "/api/tourist/explore-google", 4, 20, 0)
+        await load(client, "/bench/explore-sync", 4, 20, 0)
+
+        print(f"{args.places} places, upstream {args.upstream_ms:.0f} ms, pool mode {os.environ.get('DB_POOL_MODE', 'queue')}")
+        print(f"{'conc':>5} {'path':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for concurrency in args.concurrency:
+            for label, path in (("sync", "/bench/explore-sync"), ("async", "/api/tourist/explore-google")):
+                res = await load(client, path, concurrency, args.requests, concurrency)
+                print(f"{concurrency:>5} {label:>6} {res['rps']:>8.1f} {res['p50_ms']:>8.1f} {res['p99_ms']:>8.1f} {res['errors']:>7}")
+    from api.database import get_async_engine
+    await get_async_engine().dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--places", type=int, default=20_000, help="rows to seed into places (skipped if already present)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level and path")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--upstream-ms", type=float, default=50.0, help="simulated Wikipedia latency")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Per-row Python distance loops (the old `sqrt(dlat² + dlng²) * 111000` call sites) vs. the
+vectorized haversine queries in api.geo.
+
+    python -m benchmarks.bench_geo
+"""
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.geo import PointSet, distance_m  # noqa: E402
+
+CENTER = (11.41, 76.70)
+SPREAD_DEG = 0.3
+
+
+def old_count_within(points, lat, lng, radius):
+    return sum(1 for p_lat, p_lng in points if math.sqrt((lat - p_lat)**2 + (lng - p_lng)**2) * 111000 <= radius)
+
+
+def old_contains(zones, lat, lng):
+    return [z for z in zones if math.sqrt((lat - z[0])**2 + (lng - z[1])**2) * 111000 <= z[2]]
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat): fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def run():
+    rng = random.Random(7)
+    rand_pt = lambda: (CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+
+    print("count-within-1km (one query point vs M incidents)")
+    print(f"{'M':>8} {'loop us':>10} {'numpy us':>10} {'speedup':>8}")
+    for m in (100, 1_000, 10_000, 100_000):
+        pts = [rand_pt() for _ in range(m)]
+        ps = PointSet([p[0] for p in pts], [p[1] for p in pts])
+        q = rand_pt()
+        loop = timed(lambda: old_count_within(pts, q[0], q[1], 1000), 20)
+        vec = timed(lambda: ps.count_within(q[0], q[1], 1000), 20)
+        print(f"{m:>8} {loop * 1e6:>10.1f} {vec * 1e6:>10.1f} {loop / vec:>7.1f}x")
+
+    print("\npoint-in-zone (N pings x M zones)")
+    print(f"{'N':>6} {'M':>8} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for n, m in ((1, 1_000), (100, 1_000), (100, 10_000), (1_000, 5_000)):
+        zones = [(*rand_pt(), rng.choice([200, 400, 800])) for _ in range(m)]
+        pings = [rand_pt() for _ in range(n)]
+        ps = PointSet([z[0] for z in zones], [z[1] for z in zones], [z[2] for z in zones])
+        loop = timed(lambda: [old_contains(zones, la, ln) for la, ln in pings], 3)
+        vec = timed(lambda: ps.containing([p[0] for p in pings], [p[1] for p in pings]), 3)
+        print(f"{n:>6} {m:>8} {loop * 1e3:>10.2f} {vec * 1e3:>10.2f} {loop / vec:>7.1f}x")
+
+    # Accuracy: the flat-earth formula overstates east-west distances by 1/cos(lat)
+    print("\nflat-earth error for a 1 km east-west offset:")
+    for lat in (0, 11.4, 28.6, 34.1):
+        d_lng = 1000 / (111195 * math.cos(math.radians(lat)))
+        print(f"  lat {lat:>5}: haversine {distance_m(lat, 0, lat, d_lng):7.1f} m, old formula {d_lng * 111000:7.1f} m")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,123 @@
+"""
+Location history: write throughput, storage per ping, compaction and query latency.
+
+    python -m benchmarks.bench_history                        # fakeredis + throwaway SQLite
+    python -m benchmarks.bench_history --users 5000 --interval 2
+    REDIS_URL=redis://... DATABASE_URL=postgresql://... python -m benchmarks.bench_history
+
+Simulates one hour of pings (every --interval seconds per user, random walks around the
+Nilgiris) a few hours in the past, appended in pipelined batches of --batch users like
+/api/update-locations does. Storage is reported raw in Redis (payload bytes, plus MEMORY
+USAGE when the server supports it) and after compaction into track_hours. Needs `fakeredis`
+unless REDIS_URL is set.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CENTER = (11.41, 76.70)
+SPREAD_DEG = 0.5
+STEP_DEG = 0.0002
+
+
+def clients():
+    url = os.environ.get("KV_URL") or os.environ.get("REDIS_URL")
+    if url:
+        import redis
+        return redis.from_url(url, decode_responses=True), redis.from_url(url)
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server)
+
+
+def timed(fn, repeat: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return statistics.median(samples) * 1e3, samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--interval", type=int, default=5, help="seconds between pings per user")
+    parser.add_argument("--batch", type=int, default=200, help="users per pipelined append")
+    parser.add_argument("--downsample", type=int, default=30, help="seconds per kept sample after compaction")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}"
+    from api.database import SessionLocal, TrackHour
+    from api.history import HISTORY_KEY, HOUR, LocationHistory
+    from api.migrations import migrate
+    migrate()
+
+    r, raw = clients()
+    history = LocationHistory(lambda: r, lambda: raw, raw_hours=2, downsample_seconds=args.downsample)
+    rng = random.Random(7)
+    positions = {uid: (CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+                 for uid in range(1, args.users + 1)}
+    user_ids = list(positions)
+    # A full hour old enough for compact() to pick up
+    now = time.time()
+    hour = int(now) // HOUR - 3
+
+    pings = 0
+    write_s = 0.0
+    for offset in range(0, HOUR, args.interval):
+        for uid in user_ids:
+            lat, lng = positions[uid]
+            positions[uid] = (lat + rng.uniform(-STEP_DEG, STEP_DEG), lng + rng.uniform(-STEP_DEG, STEP_DEG))
+        for start in range(0, len(user_ids), args.batch):
+            chunk = {uid: positions[uid] for uid in user_ids[start:start + args.batch]}
+            t0 = time.perf_counter()
+            history.append(chunk, now=hour * HOUR + offset)
+            write_s += time.perf_counter() - t0
+            pings += len(chunk)
+
+    keys = [HISTORY_KEY.format(uid, hour) for uid in user_ids]
+    payload = sum(raw.strlen(key) for key in keys)
+    try:
+        memory = sum(r.memory_usage(key) or 0 for key in keys)
+    except Exception:
+        memory = None
+
+    print(f"{args.users} users x 1 h at one ping per {args.interval} s = {pings} pings, batches of {args.batch}")
+    print(f"append throughput       {pings / write_s:>12,.0f} pings/s")
+    print(f"redis payload           {payload / pings:>12.1f} B/ping")
+    if memory: print(f"redis MEMORY USAGE      {memory / pings:>12.1f} B/ping")
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        stats = history.compact(db, now=now)
+        compact_ms = (time.perf_counter() - t0) * 1e3
+        stored = sum(len(blob) for (blob,) in db.query(TrackHour.samples).filter(TrackHour.hour == hour))
+        print(f"compaction              {compact_ms:>12.1f} ms for {stats['users']} user-hours, {stats['samples_in']} -> {stats['samples_out']} samples")
+        print(f"db sample bytes         {stored / pings:>12.2f} B/ping (1 per {args.downsample} s kept)")
+
+        start, end = hour * HOUR, hour * HOUR + HOUR - 1
+        picks = [rng.choice(user_ids) for _ in range(args.queries)]
+        it = iter(picks)
+        p50, p99 = timed(lambda: history.track(db, next(it), start, end), args.queries)
+        print(f"track 1 h               {p50:>9.2f} ms p50 {p99:>7.2f} ms p99")
+        points = iter([positions[uid] for uid in picks])
+        p50, p99 = timed(lambda: history.near(db, *next(points), 500, start, end), args.queries)
+        print(f"near 500 m, 1 h         {p50:>9.2f} ms p50 {p99:>7.2f} ms p99")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Point-in-zone lookup latency vs. zone count: linear scan (old get_safety_status) vs. ZoneIndex.
+
+    python -m benchmarks.bench_zone_index
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.geo import ZoneIndex, ZoneEntry, distance_m  # noqa: E402
+
+CENTER = (11.41, 76.70)  # Ooty
+SPREAD_DEG = 0.5
+QUERIES = 2000
+
+
+def make_zones(n, rng):
+    return [
+        ZoneEntry(i, f"zone-{i}", CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+                  CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), rng.choice([200, 300, 400, 500, 800]), "Danger")
+        for i in range(n)
+    ]
+
+
+def linear_lookup(zones, lat, lng):
+    for zone in zones:
+        if distance_m(lat, lng, zone.lat, zone.lng) <= zone.radius:
+            return zone
+    return None
+
+
+def run():
+    rng = random.Random(42)
+    points = [(CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)) for _ in range(QUERIES)]
+    print(f"{'zones':>8} {'linear us/q':>12} {'index us/q':>12} {'speedup':>8} {'build ms':>9}")
+    for n in (100, 1_000, 5_000, 20_000, 50_000):
+        zones = make_zones(n, rng)
+        index = ZoneIndex()
+        t0 = time.perf_counter(); index.rebuild(zones); build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for lat, lng in points: linear_lookup(zones, lat, lng)
+        linear = (time.perf_counter() - t0) / QUERIES
+
+        t0 = time.perf_counter()
+        for lat, lng in points: index.containing(lat, lng)
+        indexed = (time.perf_counter() - t0) / QUERIES
+
+        print(f"{n:>8} {linear * 1e6:>12.1f} {indexed * 1e6:>12.1f} {linear / indexed:>7.1f}x {build * 1e3:>9.1f}")
+
+
+if __name__ == "__main__":
+    run()
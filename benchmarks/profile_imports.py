@@ -0,0 +1,71 @@
+"""
+Import-time profile of the serverless entry point, from `python -X importtime`.
+
+    python -m benchmarks.profile_imports                   # top packages by self time
+    python -m benchmarks.profile_imports --top 40 --tree   # plus the heaviest direct imports
+    python -m benchmarks.profile_imports --budget-ms 900   # exit 1 if `import api.index` is slower
+
+Self time is summed per top-level package, so `sqlalchemy.orm.*` shows up as one row.
+Numbers come from one fresh interpreter per run; use --runs to take the median.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def profile(module: str) -> list[tuple[int, int, int, str]]:
+    """(self_us, cumulative_us, depth, name) for every module imported by `import module`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line: continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="api.index")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--tree", action="store_true", help="also list the costliest imports made directly by our modules")
+    parser.add_argument("--budget-ms", type=float, help="fail if the median cumulative import time exceeds this")
+    args = parser.parse_args()
+
+    runs = [profile(args.module) for _ in range(args.runs)]
+    totals = [next(cum for _, cum, _, name in rows if name == args.module) / 1000 for rows in runs]
+    rows = runs[totals.index(statistics.median(totals))]
+
+    by_package = defaultdict(int)
+    for self_us, _, _, name in rows: by_package[name.split(".")[0]] += self_us
+    print(f"import {args.module}: {statistics.median(totals):.1f} ms (median of {args.runs})\n")
+    print(f"{'package':<28} {'self ms':>8} {'share':>6}")
+    total_self = sum(by_package.values())
+    for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{package:<28} {self_us / 1000:>8.1f} {self_us / total_self:>6.1%}")
+
+    if args.tree:
+        # A module's imports are printed before it, one level deeper, so walk backwards to attribute them
+        print(f"\n{'imported by':<20} {'module':<36} {'cumulative ms':>13}")
+        direct, parents = [], {}
+        for self_us, cum, depth, name in reversed(rows):
+            parents[depth] = name
+            parent = parents.get(depth - 1, "")
+            if parent.startswith("api") and not name.startswith("api"): direct.append((cum, parent, name))
+        for cum, parent, name in sorted(direct, reverse=True)[:args.top]:
+            print(f"{parent:<20} {name:<36} {cum / 1000:>13.1f}")
+
+    if args.budget_ms is not None and statistics.median(totals) > args.budget_ms:
+        print(f"\nimport time exceeds the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -55,7 +55,7 @@ function App() {
             {/* 4. Protected Tourist Dashboard (Any logged-in user) */}
             <Route 
               path="/dashboard" 
-              element={user ? <Dashboard user={user} /> : <Navigate to="/login" replace />} 
+              element={user ? <Dashboard user={user} onLogout={logout} /> : <Navigate to="/login" replace />} 
             />
 
             {/* 5. Protected Admin Command Center (Requires is_admin: true) */}
@@ -85,7 +85,7 @@ const Admin = () => {
 
   const fetchData = async () => {
     try {
-      const [tRes, zRes, pRes] = await Promise.all([ fetch('/api/admin/tourists'), fetch('/api/admin/safe-zones'), fetch('/api/places') ]);
+      const [tRes, zRes, pRes] = await Promise.all([ fetch('/api/admin/tourists/online'), fetch('/api/admin/safe-zones'), fetch('/api/places') ]);
       if (tRes.ok && zRes.ok && pRes.ok) {
         setTourists(await tRes.json()); setSafeZones(await zRes.json()); setPlaces(await pRes.json());
       }
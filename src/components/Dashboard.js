@@ -20,7 +20,7 @@ function MapRecenter({ location }) {
   return null;
 }
 
-const Dashboard = ({ user }) => {
+const Dashboard = ({ user, onLogout }) => {
   const [location, setLocation] = useState(null);
   const [city, setCity] = useState("Detecting...");
   const [contacts, setContacts] = useState([]);
@@ -76,15 +76,17 @@ const Dashboard = ({ user }) => {
       
       try {
         const res = await fetch('/api/update-location', { 
-          method: 'POST', headers: { 'Content-Type': 'application/json' }, 
+          method: 'POST', headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${user.access_token}` }, 
           body: JSON.stringify({ username: user.username, ...coords }) 
         });
         if (res.ok) setSafety(await res.json());
+        // Expired or invalid session token: send the user back to log in
+        else if (res.status === 401 && onLogout) onLogout();
       } catch (err) { console.error(err); }
     }, null, { enableHighAccuracy: true });
     
     return () => navigator.geolocation.clearWatch(watchId);
-  }, [user.username]);
+  }, [user.username, user.access_token, onLogout]);
 
   // Fetch Nearby Places with proper Loading State
   useEffect(() => {
@@ -110,7 +112,7 @@ const Dashboard = ({ user }) => {
     if (window.confirm("🚨 Are you in danger? This will broadcast an alert!")) {
       setIsSosLoading(true);
       try {
-        await fetch('/api/tourist/sos', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ username: user.username, lat: location.lat, lng: location.lng }) });
+        await fetch('/api/tourist/sos', { method: 'POST', headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${user.access_token}` }, body: JSON.stringify({ username: user.username, lat: location.lat, lng: location.lng }) });
         alert("SOS Broadcasted! A temporary danger zone has been generated.");
         fetchMapData(); 
       } catch (err) { alert("Failed to send SOS."); } 
@@ -0,0 +1,44 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Read by api.database at import time, so set before any test imports the app
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'test.db'}"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ.pop("KV_URL", None)
+os.environ.pop("REDIS_URL", None)
+
+
+@pytest.fixture(scope="session")
+def idx():
+    import api.index as idx
+    from api.migrations import migrate
+    migrate()
+    return idx
+
+
+@pytest.fixture
+def redis(idx, monkeypatch):
+    import fakeredis
+    server = fakeredis.FakeServer()
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(idx, "r", r)
+    monkeypatch.setattr(idx, "_raw_redis", fakeredis.FakeRedis(server=server))
+    return r
+
+
+@pytest.fixture
+def client(idx, redis):
+    from fastapi.testclient import TestClient
+    # No context manager: shutdown hooks would close the shared bcrypt pool for later tests
+    return TestClient(idx.app)
+
+
+@pytest.fixture
+def db(idx):
+    from api.database import SessionLocal
+    session = SessionLocal()
+    yield session
+    session.close()
@@ -0,0 +1,48 @@
+import uuid
+
+from api.database import User
+
+
+def make_user(db, is_admin=False) -> User:
+    user = User(username=f"auth-{uuid.uuid4().hex[:8]}", hashed_password="x", digital_id=f"DID_{uuid.uuid4().hex[:12]}", is_admin=is_admin)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def bearer(idx, user) -> dict:
+    return {"Authorization": f"Bearer {idx.token_verifier.issue(user.username, user.id, user.is_admin)}"}
+
+
+def test_body_usernames_rejected_when_disabled(client, idx, db, monkeypatch):
+    user = make_user(db)
+    monkeypatch.setattr(idx, "ALLOW_BODY_USERNAME", False)
+    ping = {"username": user.username, "lat": 12.0, "lng": 77.0}
+    assert client.post("/api/update-locations", json=[ping]).status_code == 401
+    assert client.post("/api/tourist/sos", json=ping).status_code == 401
+
+
+def test_tourist_token_only_covers_own_pings(client, idx, db, monkeypatch):
+    user, other = make_user(db), make_user(db)
+    monkeypatch.setattr(idx, "ALLOW_BODY_USERNAME", False)
+    pings = [{"lat": 12.0, "lng": 77.0}, {"username": other.username, "lat": 12.1, "lng": 77.1}]
+    res = client.post("/api/update-locations", json=pings, headers=bearer(idx, user))
+    assert res.status_code == 200
+    mine, theirs = res.json()
+    assert mine["username"] == user.username and "status" in mine
+    assert theirs == {"username": other.username, "error": "Not allowed", "lat": 12.1, "lng": 77.1}
+
+
+def test_admin_token_relays_for_anyone(client, idx, db, monkeypatch):
+    admin, user = make_user(db, is_admin=True), make_user(db)
+    monkeypatch.setattr(idx, "ALLOW_BODY_USERNAME", False)
+    res = client.post("/api/update-locations", json=[{"username": user.username, "lat": 12.0, "lng": 77.0}], headers=bearer(idx, admin))
+    assert res.status_code == 200 and "status" in res.json()[0]
+
+
+def test_sos_is_attributed_to_the_token(client, idx, db, monkeypatch):
+    user = make_user(db)
+    monkeypatch.setattr(idx, "ALLOW_BODY_USERNAME", False)
+    res = client.post("/api/tourist/sos", json={"username": "someone-else", "lat": 8.0, "lng": 76.0}, headers=bearer(idx, user))
+    assert res.status_code == 200
+    assert db.query(idx.IncidentReport.username).filter(idx.IncidentReport.lat == 8.0).all() == [(user.username,)]
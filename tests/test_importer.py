@@ -0,0 +1,79 @@
+import asyncio
+import io
+
+from api.database import Place, SafeZone
+from api.importer import aiter_lines, aparse_records, parse_records
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size): yield data[i:i + size]
+
+
+async def collect(aiter):
+    return [item async for item in aiter]
+
+
+def test_multibyte_characters_split_across_chunks():
+    data = '{"name": "Ooty Lake — ஊட்டி"}\n{"name": "Café"}'.encode()
+    # One byte per chunk splits every multibyte character
+    assert asyncio.run(collect(aparse_records(chunked(data, 1), "jsonl"))) == [{"name": "Ooty Lake — ஊட்டி"}, {"name": "Café"}]
+    assert asyncio.run(collect(aiter_lines(chunked("é\nü".encode(), 1)))) == ["é\n", "ü"]
+
+
+class FakeWiki:
+    async def geosearch(self, lat, lng, radius, limit):
+        return {"1": {"title": "Old Cemetery", "description": "abandoned cemetery", "coordinates": [{"lat": lat + 0.02, "lon": lng}]}}
+
+
+async def fake_evaluate(name, p_type, lat, lng, rating, fee, db):
+    return {"base_category": "Safe", "is_hybrid": False, "night_category": "Safe"}
+
+
+def test_reanalysis_replaces_the_places_zones(idx, redis, db, monkeypatch):
+    monkeypatch.setattr(idx, "evaluate_hybrid_safety", fake_evaluate)
+    run = lambda: asyncio.run(idx.generate_hybrid_smart_zones("Reanalysed", 11.0, 76.0, "park", 4.5, 0.0, wiki=FakeWiki(), place_id=4242))
+    zones = lambda: db.query(SafeZone.name).filter(SafeZone.lat.between(10.99, 11.03), SafeZone.lng == 76.0).order_by(SafeZone.name).all()
+    run()
+    assert zones() == [("AI Analysis: Reanalysed",), ("Wiki-Danger: Old Cemetery",)]
+    run()
+    db.expire_all()
+    assert zones() == [("AI Analysis: Reanalysed",), ("Wiki-Danger: Old Cemetery",)]
+
+
+def test_reanalysis_replaces_zones_written_before_place_keys(idx, redis, db, monkeypatch):
+    monkeypatch.setattr(idx, "evaluate_hybrid_safety", fake_evaluate)
+    db.add(SafeZone(name="AI Analysis: Legacy", lat=12.0, lng=75.0, radius=300, category="Safe", source="HF-AI"))
+    db.add(SafeZone(name="Wiki-Danger: Old Cemetery", lat=12.02, lng=75.0, radius=400, category="Danger", source="Wiki+HF AI"))
+    db.commit()
+    asyncio.run(idx.generate_hybrid_smart_zones("Legacy", 12.0, 75.0, "park", 4.5, 0.0, wiki=FakeWiki(), place_id=4343))
+    db.expire_all()
+    zones = db.query(SafeZone.place_id).filter(SafeZone.lat.between(11.99, 12.03), SafeZone.lng == 75.0).all()
+    assert zones == [(4343,), (4343,)]
+
+
+def test_csv_stream_skips_blank_lines_and_keeps_quoted_newlines():
+    data = b'name,lat,details\r\n\r\na,1,"line1\nline2"\n\n"b, c",3,\n\nd,5,"x ""quoted""\n"'
+    records = asyncio.run(collect(aparse_records(chunked(data, 3), "csv")))
+    assert records == [
+        {"name": "a", "lat": "1", "details": "line1\nline2"},
+        {"name": "b, c", "lat": "3", "details": ""},
+        {"name": "d", "lat": "5", "details": 'x "quoted"'},
+    ]
+    # Same rows as the file path's single DictReader
+    assert records == list(parse_records(io.StringIO(data.decode(), newline=""), "csv"))
+
+
+def test_import_route_survives_blank_lines_and_queue_outage(client, idx, db, monkeypatch):
+    analysed = []
+
+    async def fake_inline(payload): analysed.append(payload["name"])
+    def unavailable(jobs): raise ConnectionError("redis down")
+
+    monkeypatch.setattr(idx, "run_place_analysis_inline", fake_inline)
+    monkeypatch.setattr(idx.job_queue, "submit_many", unavailable)
+    body = 'name,lat,lng,details\nimp-a,1,2,\n\nimp-b,3,4,"two\nlines"\n'
+    res = client.post("/api/admin/places/import?batch_size=1", content=body, headers={"content-type": "text/csv"})
+    assert res.status_code == 200
+    assert res.json() == {"inserted": 2, "queued": 0, "inline": 2, "failed": 0, "skipped": 0, "batches": 2}
+    assert analysed == ["imp-a", "imp-b"]
+    assert db.query(Place.details).filter(Place.name == "imp-b").one() == ("two\nlines",)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from api.database import IncidentReport, SafeZone, User
+from api.geo import ZoneIndex
+from api.incidents import IncidentDensity
+
+
+def test_add_after_sync_counts_once(db):
+    density = IncidentDensity()
+    report = IncidentReport(username="a", lat=10.0, lng=70.0, reported_at=datetime.utcnow())
+    db.add(report)
+    db.flush()
+    # The sync sees the flushed row, then the caller adds it again
+    density.ensure_synced(db)
+    density.add(report.id, report.lat, report.lng, report.reported_at)
+    assert density.count(10.0, 70.0, 1000, timedelta(hours=48)) == 1
+    db.rollback()
+
+
+def test_reports_committed_out_of_id_order_are_all_counted():
+    density = IncidentDensity()
+    now = datetime.utcnow()
+    density._apply([(11, 10.0, 70.0, now)], (now, now - density.retention))
+    density.add(10, 10.0, 70.0, now)
+    assert density.count(10.0, 70.0, 1000, timedelta(hours=48)) == 2
+
+
+def test_sync_rereads_a_late_commit_once(db):
+    density = IncidentDensity(sync_interval=0)
+    early = IncidentReport(id=900_001, username="early", lat=-33.0, lng=151.0, reported_at=datetime.utcnow())
+    db.add(early)
+    db.commit()
+    density.ensure_synced(db)
+    # A lower id, reported before that sync but committed after it (e.g. by another instance)
+    late = IncidentReport(id=900_000, username="late", lat=-33.0, lng=151.0, reported_at=datetime.utcnow() - timedelta(seconds=5))
+    db.add(late)
+    db.commit()
+    density.ensure_synced(db)
+    density.ensure_synced(db)
+    assert density.count(-33.0, 151.0, 1000, timedelta(hours=48)) == 2
+    db.delete(early)
+    db.delete(late)
+    db.commit()
+
+
+def test_count_window_and_radius():
+    density = IncidentDensity()
+    now = datetime.utcnow()
+    density.add(1, 10.0, 70.0, now)
+    density.add(2, 10.005, 70.0, now)            # ~556 m north
+    density.add(3, 10.02, 70.0, now)             # ~2.2 km north
+    density.add(4, 10.0, 70.0, now - timedelta(hours=50))
+    assert density.count(10.0, 70.0, 1000, timedelta(hours=48)) == 2
+    assert density.count(10.0, 70.0, 3000, timedelta(hours=48)) == 3
+
+
+def test_single_sos_creates_caution_zone(client, idx, db, monkeypatch):
+    monkeypatch.setattr(idx, "incident_density", IncidentDensity())
+    monkeypatch.setattr(idx, "zone_index", ZoneIndex())
+    if not db.query(User.id).filter(User.username == "sos-user").first():
+        db.add(User(username="sos-user", hashed_password="x", digital_id="DID_sos_user"))
+        db.commit()
+    names = []
+    for _ in range(3):
+        assert client.post("/api/tourist/sos", json={"username": "sos-user", "lat": 9.5, "lng": 77.5}).status_code == 200
+        names.append(db.query(SafeZone.name).filter(SafeZone.lat == 9.5).order_by(SafeZone.id.desc()).first()[0])
+    # Only the third report in the cluster escalates
+    assert names == ["CAUTION: SOS Reported", "CAUTION: SOS Reported", "CRITICAL: SOS Alerts!"]
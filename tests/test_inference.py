@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from api.inference import HFPredictor
+
+API_URL = "https://space.test/call/predict"
+
+
+class Space:
+    """Fake Gradio Space: POST hands out an event id, GET streams that event's SSE result."""
+
+    def __init__(self, streams: list[str] = None, delay: float = 0.0):
+        # SSE bodies served to successive GETs; the last one repeats
+        self.streams = streams or ["event: complete\ndata: [1]\n\n"]
+        self.delay = delay
+        self.posts, self.gets = [], 0
+        self.active = self.peak = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            self.posts.append(json.loads(request.content))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            if self.delay: await asyncio.sleep(self.delay)
+            return httpx.Response(200, json={"event_id": f"ev{len(self.posts)}"})
+        body = self.streams[min(self.gets, len(self.streams) - 1)]
+        self.gets += 1
+        if "event: complete" in body or "event: error" in body: self.active -= 1
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+
+def predictor(space, **kwargs) -> HFPredictor:
+    return HFPredictor(API_URL, transport=httpx.MockTransport(space), poll_backoff=0.001, **kwargs)
+
+
+def run(hf: HFPredictor, *calls):
+    async def go():
+        try: return await asyncio.gather(*[hf.predict(*c) for c in calls])
+        finally: await hf.aclose()
+    return asyncio.run(go())
+
+
+def test_complete_event_returns_prediction():
+    space = Space(["event: generating\ndata: null\n\nevent: complete\ndata: [2]\n\n"])
+    assert run(predictor(space), ("park", 4.5, 0)) == [2]
+    assert space.posts == [{"data": ["park", 4.5, 0.0]}]
+
+
+def test_error_event_raises_and_category_falls_back():
+    space = Space(["event: error\ndata: \"model crashed\"\n\n"])
+    with pytest.raises(RuntimeError, match="model crashed"):
+        run(predictor(space), ("park", 4.5, 0))
+
+    async def category():
+        hf = predictor(space)
+        try: return await hf.category("park", 4.5, 0, default="Danger")
+        finally: await hf.aclose()
+    assert asyncio.run(category()) == "Danger"
+
+
+def test_reattaches_when_the_stream_closes_early():
+    space = Space(["event: heartbeat\ndata: null\n\n", ": queue busy\n\n", "event: complete\ndata: [0]\n\n"])
+    assert run(predictor(space), ("museum", 4.0, 10)) == [0]
+    assert space.gets == 3
+
+
+def test_gives_up_after_poll_attempts():
+    space = Space(["event: heartbeat\ndata: null\n\n"])
+    with pytest.raises(TimeoutError):
+        run(predictor(space, poll_attempts=3), ("museum", 4.0, 10))
+    assert space.gets == 3
+
+
+def test_predictions_are_memoized_per_input():
+    space = Space()
+    hf = predictor(space)
+
+    async def go():
+        try:
+            first = await asyncio.gather(*[hf.predict("park", 4.5, 0) for _ in range(5)])
+            again = await hf.predict("park", 4.5, 0.0)
+            other = await hf.predict("park", 4.5, 20)
+            return first, again, other
+        finally: await hf.aclose()
+
+    first, again, other = asyncio.run(go())
+    assert first == [1] * 5 and again == other == 1
+    # Concurrent and repeated calls share one upstream call; a different fee is a new key
+    assert len(space.posts) == 2
+
+
+def test_semaphore_caps_concurrent_calls():
+    space = Space(delay=0.02)
+    results = run(predictor(space, max_concurrency=2), *[("park", 4.5, fee) for fee in range(8)])
+    assert results == [1] * 8
+    assert len(space.posts) == 8 and space.peak == 2
@@ -0,0 +1,67 @@
+import threading
+import uuid
+
+from api.database import SessionLocal, User
+from api.ingest import LocationWriteBuffer
+
+
+def make_user(db) -> User:
+    user = User(username=f"ingest-{uuid.uuid4().hex[:8]}", hashed_password="x", digital_id=f"DID_{uuid.uuid4().hex[:12]}")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def position(user_id):
+    with SessionLocal() as db:
+        return db.query(User.last_lat, User.last_lng).filter(User.id == user_id).one()
+
+
+def test_deleted_user_does_not_block_the_buffer(db):
+    user, gone = make_user(db), make_user(db)
+    buffer = LocationWriteBuffer()
+    buffer.add(gone.id, 1.0, 1.0)
+    db.delete(gone)
+    db.commit()
+    buffer.add(user.id, 12.5, 77.5)
+    assert buffer.flush(db) == 2
+    assert position(user.id) == (12.5, 77.5)
+    # Nothing was re-queued
+    assert buffer.flush(db) == 0
+
+
+def test_batch_update_is_not_overwritten_by_older_buffered_ping(client, idx, db, monkeypatch):
+    user = make_user(db)
+    monkeypatch.setattr(idx, "location_buffer", LocationWriteBuffer(flush_size=1000, flush_interval=3600))
+    idx.location_buffer.add(user.id, 1.0, 1.0)
+    res = client.post("/api/update-locations", json=[{"username": user.username, "lat": 2.0, "lng": 2.0}])
+    assert res.status_code == 200
+    idx.location_buffer.flush(db)
+    assert position(user.id) == (2.0, 2.0)
+
+
+def test_timer_flushes_without_further_pings(db):
+    user = make_user(db)
+    flushed = threading.Event()
+
+    def on_due():
+        with SessionLocal() as session: buffer.flush(session)
+        flushed.set()
+
+    buffer = LocationWriteBuffer(flush_size=1000, flush_interval=0.05, on_due=on_due)
+    buffer.add(user.id, 3.0, 4.0)
+    assert flushed.wait(5)
+    assert position(user.id) == (3.0, 4.0)
+
+
+def test_batch_flush_error_still_returns_statuses(client, idx, db, monkeypatch):
+    user = make_user(db)
+    buffer = LocationWriteBuffer(flush_size=1000, flush_interval=3600)
+    monkeypatch.setattr(idx, "location_buffer", buffer)
+
+    def broken(session): raise RuntimeError("db down")
+    monkeypatch.setattr(buffer, "flush", broken)
+    res = client.post("/api/update-locations", json=[{"username": user.username, "lat": 5.0, "lng": 6.0}])
+    assert res.status_code == 200
+    assert res.json()[0]["status"] == "You are in a safe area"
+    assert idx.r.zscore("live:seen", user.username) is not None
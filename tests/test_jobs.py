@@ -0,0 +1,63 @@
+import fakeredis
+import pytest
+
+from api.jobs import JOB_KEY, PROCESSING_KEY, QUEUE_KEY, JobQueue
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def queue():
+    r = fakeredis.FakeRedis(decode_responses=True)
+    return JobQueue(lambda: r, max_attempts=2, lease=60)
+
+
+def test_lease_expiry_requeues_the_job(queue):
+    job_id, _ = queue.submit("place_analysis", {"place_id": 1})
+    job = queue.reserve(timeout=0.01)
+    r = queue.redis()
+    r.hset(JOB_KEY.format(job_id), "started_at", NOW)
+    assert queue.requeue_expired(now=NOW + 30) == 0
+    assert queue.requeue_expired(now=NOW + 61) == 1
+    assert r.lrange(QUEUE_KEY, 0, -1) == [job["id"]] and r.llen(PROCESSING_KEY) == 0
+
+
+def test_job_without_a_lease_is_requeued_after_one_lease(queue):
+    job_id, _ = queue.submit("place_analysis", {"place_id": 1})
+    r = queue.redis()
+    # A worker that crashed right after BLMOVE, before writing started_at
+    r.lmove(QUEUE_KEY, PROCESSING_KEY, "RIGHT", "LEFT")
+    assert queue.requeue_expired(now=NOW) == 0
+    assert queue.requeue_expired(now=NOW + 30) == 0
+    assert queue.requeue_expired(now=NOW + 61) == 1
+    assert queue.status(job_id)["status"] == "queued"
+    # The next reservation writes a fresh lease
+    job = queue.reserve(timeout=0.01)
+    assert job["id"] == job_id and "orphaned_at" not in job
+
+
+def test_lease_expiry_past_max_attempts_fails_the_job(queue):
+    job_id, _ = queue.submit("place_analysis", {"place_id": 1})
+    r = queue.redis()
+    for attempt in range(2):
+        queue.reserve(timeout=0.01)
+        r.hset(JOB_KEY.format(job_id), "started_at", NOW)
+        queue.requeue_expired(now=NOW + 61)
+    job = queue.status(job_id)
+    assert job["status"] == "failed" and job["attempts"] == 2
+    assert r.llen(QUEUE_KEY) == 0 and r.llen(PROCESSING_KEY) == 0
+
+
+def test_bulk_places_fall_back_to_inline_analysis(client, idx, monkeypatch):
+    analysed = []
+
+    async def fake_inline(payload): analysed.append(payload["place_id"])
+    def unavailable(jobs): raise ConnectionError("redis down")
+
+    monkeypatch.setattr(idx, "run_place_analysis_inline", fake_inline)
+    monkeypatch.setattr(idx.job_queue, "submit_many", unavailable)
+    res = client.post("/api/admin/places/bulk", json=[{"name": "A", "lat": 11.0, "lng": 76.0}, {"name": "B"}])
+    assert res.status_code == 200
+    rows = res.json()
+    assert [row["job_id"] for row in rows] == [None, None]
+    assert analysed == [rows[0]["place_id"]]
@@ -0,0 +1,66 @@
+import fakeredis
+import pytest
+
+from api import live
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def seed(r):
+    live.record_positions(r, {"fresh": (11.41, 76.70), "near": (11.415, 76.70)}, now=NOW - 5)
+    live.record_positions(r, {"lapsed": (11.41, 76.71)}, now=NOW - live.LIVE_TTL - 30)
+    live.record_positions(r, {"ancient": (11.41, 76.72)}, now=NOW - live.PRUNE_AFTER - 1)
+
+
+def test_queue_positions_writes_geo_and_freshness(r):
+    pipe = r.pipeline(transaction=False)
+    live.queue_positions(pipe, {"a": (11.41, 76.70)}, now=NOW, publish=False)
+    live.queue_positions(pipe, {}, now=NOW)
+    pipe.execute()
+    assert r.zscore(live.LIVE_SEEN_KEY, "a") == NOW
+    (lat, lng), = live.positions(r, ["a"]).values()
+    assert lat == pytest.approx(11.41, abs=1e-5) and lng == pytest.approx(76.70, abs=1e-5)
+
+
+def test_online_names_only_counts_fresh_pings(r):
+    seed(r)
+    assert sorted(live.online_names(r, now=NOW)) == ["fresh", "near"]
+    assert sorted(live.online_positions(r, now=NOW)) == ["fresh", "near"]
+
+
+def test_changed_since_reports_moves_and_lapses(r):
+    seed(r)
+    moved, offline = live.changed_since(r, since=NOW - 10, now=NOW)
+    assert sorted(moved) == ["fresh", "near"] and offline == []
+    # Polling again later: nobody pinged, and both members have since lapsed
+    moved, offline = live.changed_since(r, since=NOW, now=NOW + live.LIVE_TTL)
+    assert moved == {} and sorted(offline) == ["fresh", "near"]
+
+
+def test_tourists_within_is_fresh_and_nearest_first(r):
+    seed(r)
+    hits = live.tourists_within(r, 11.41, 76.70, 5000, now=NOW)
+    assert [h["username"] for h in hits] == ["fresh", "near"]
+    assert hits[0]["distance_m"] < hits[1]["distance_m"]
+    assert live.tourists_within(r, 0.0, 0.0, 1000, now=NOW) == []
+
+
+def test_online_in_box_trims_to_bounds(r):
+    seed(r)
+    live.record_positions(r, {"outside": (11.43, 76.70)}, now=NOW)
+    # The search circle around this box reaches "outside"; the trim must drop it
+    assert sorted(live.online_in_box(r, 11.40, 76.69, 11.42, 76.73, now=NOW)) == ["fresh", "near"]
+    assert live.online_in_box(r, 20.0, 70.0, 20.1, 70.1, now=NOW) == {}
+
+
+def test_prune_stale_drops_only_long_lapsed_members(r):
+    seed(r)
+    assert live.prune_stale(r, now=NOW) == 1
+    assert r.zscore(live.LIVE_SEEN_KEY, "ancient") is None and live.positions(r, ["ancient"]) == {}
+    assert r.zscore(live.LIVE_SEEN_KEY, "lapsed") is not None
+    assert live.prune_stale(r, now=NOW) == 0
@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine, inspect
+
+from api.database import Base
+from api.migrations import MIGRATIONS, migrate, status
+
+
+def test_fresh_database_matches_the_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert migrate(bind=engine) == [version for version, _, _ in MIGRATIONS]
+    assert migrate(bind=engine) == []
+    assert all(applied for _, _, applied in status(bind=engine))
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {c["name"] for c in inspector.get_columns(table.name)} == {c.name for c in table.columns}, table.name
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        assert {i.name for i in table.indexes} <= indexes, table.name
+
+
+def test_baseline_stops_at_the_first_release(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    migrate(bind=engine, target=1)
+    inspector = inspect(engine)
+    assert set(inspector.get_table_names()) == {"schema_version", "users", "places", "safe_zones", "incident_reports"}
+    assert "place_id" not in {c["name"] for c in inspector.get_columns("safe_zones")}
+    assert "ix_places_lat_lng" not in {i["name"] for i in inspector.get_indexes("places")}
@@ -0,0 +1,22 @@
+import asyncio
+
+from api.database import AsyncSessionLocal, Place
+
+
+def test_nearest_places_ignores_box_corners(idx, db):
+    lat, lng = -40.0, -120.0
+    # Inside the 10 km box but ~12 km away, in its corner; the true nearest is ~10.5 km north, just outside the box
+    corner = Place(name="Corner", city="", img="", details="", lat=lat + 0.08, lng=lng + 0.10)
+    north = Place(name="North", city="", img="", details="", lat=lat + 0.095, lng=lng)
+    db.add_all([corner, north])
+    db.commit()
+
+    async def run(k):
+        async with AsyncSessionLocal() as session:
+            return [(p.name, round(d / 1000, 1)) for p, d in await idx.nearest_places(session, lat, lng, k)]
+
+    assert asyncio.run(run(1)) == [("North", 10.6)]
+    assert asyncio.run(run(2)) == [("North", 10.6), ("Corner", 12.3)]
+    db.delete(corner)
+    db.delete(north)
+    db.commit()
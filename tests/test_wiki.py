@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import fakeredis
+import httpx
+
+from api.wiki import WikiGeoSearch
+
+
+class Upstream:
+    """Fake Wikipedia API; answers with one page naming the call number."""
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        n = self.calls
+        if self.delay: await asyncio.sleep(self.delay)
+        return httpx.Response(200, json={"query": {"pages": {str(n): {"title": f"call {n}"}}}})
+
+
+def search(upstream, **kwargs) -> WikiGeoSearch:
+    return WikiGeoSearch(transport=httpx.MockTransport(upstream), **kwargs)
+
+
+def test_cache_hit_skips_upstream():
+    upstream = Upstream()
+
+    async def run():
+        wiki = search(upstream)
+        first = await wiki.geosearch(11.41, 76.70)
+        # A few metres away: same geohash cell, same entry
+        second = await wiki.geosearch(11.41001, 76.70001)
+        await wiki.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == {"1": {"title": "call 1"}}
+    assert upstream.calls == 1
+
+
+def test_redis_entry_is_shared_between_instances():
+    upstream, server = Upstream(), fakeredis.FakeServer()
+    redis = lambda: fakeredis.FakeRedis(server=server, decode_responses=True)
+
+    async def run():
+        for _ in range(2):
+            wiki = search(upstream, redis=redis)
+            pages = await wiki.geosearch(11.41, 76.70)
+            await wiki.aclose()
+        return pages
+
+    assert asyncio.run(run()) == {"1": {"title": "call 1"}}
+    assert upstream.calls == 1
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    upstream = Upstream(delay=0.05)
+
+    async def run():
+        wiki = search(upstream, ttl=60, stale_ttl=600)
+        key = wiki.cache_key(11.41, 76.70, 10000, 20)
+        wiki._cache[key] = (time.time() - 120, {"old": {}})
+        served = [await wiki.geosearch(11.41, 76.70) for _ in range(3)]
+        await wiki._inflight[key]
+        refreshed = await wiki.geosearch(11.41, 76.70)
+        await wiki.aclose()
+        return served, refreshed
+
+    served, refreshed = asyncio.run(run())
+    assert served == [{"old": {}}] * 3
+    assert refreshed == {"1": {"title": "call 1"}}
+    assert upstream.calls == 1
+
+
+def test_expired_entry_is_refetched():
+    upstream = Upstream()
+
+    async def run():
+        wiki = search(upstream, ttl=60, stale_ttl=600)
+        wiki._cache[wiki.cache_key(11.41, 76.70, 10000, 20)] = (time.time() - 1000, {"old": {}})
+        pages = await wiki.geosearch(11.41, 76.70)
+        await wiki.aclose()
+        return pages
+
+    assert asyncio.run(run()) == {"1": {"title": "call 1"}}
+
+
+def test_concurrent_misses_share_one_call():
+    upstream = Upstream(delay=0.05)
+
+    async def run():
+        wiki = search(upstream)
+        results = await asyncio.gather(*[wiki.geosearch(11.41, 76.70) for _ in range(10)])
+        await wiki.aclose()
+        return results
+
+    assert asyncio.run(run()) == [{"1": {"title": "call 1"}}] * 10
+    assert upstream.calls == 1
+
+
+def test_lru_evicts_least_recently_used():
+    upstream = Upstream()
+    a, b, c = (11.41, 76.70), (12.97, 77.59), (19.07, 72.87)
+
+    async def run():
+        wiki = search(upstream, max_entries=2)
+        await wiki.geosearch(*a)
+        await wiki.geosearch(*b)
+        await wiki.geosearch(*a)      # touch a, so b is now the oldest
+        await wiki.geosearch(*c)      # evicts b
+        assert upstream.calls == 3
+        await wiki.geosearch(*a)
+        assert upstream.calls == 3
+        await wiki.geosearch(*b)
+        assert upstream.calls == 4
+        assert len(wiki._cache) == 2
+        await wiki.aclose()
+
+    asyncio.run(run())
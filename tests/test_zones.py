@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from api.database import SafeZone
+
+
+def zone_at(db, lat, lng, **kwargs) -> SafeZone:
+    zone = SafeZone(name="Elsewhere SOS", lat=lat, lng=lng, radius=200, category="Danger", source="UserSOS", **kwargs)
+    db.add(zone)
+    db.commit()
+    return zone
+
+
+def test_other_instances_changes_are_seen_on_the_next_lookup(idx, redis, db):
+    point = (-12.0, 130.0)
+    assert idx.get_safety_status(*point, db) == ("You are in a safe area", "info")
+
+    # Another instance commits a zone and bumps the shared version; no TTL wait
+    zone = zone_at(db, *point, expires_at=datetime.utcnow() + timedelta(hours=1))
+    redis.incr(idx.ZONE_VERSION_KEY)
+    assert idx.get_safety_status(*point, db) == ("Entered Elsewhere SOS", "danger")
+
+    db.delete(zone)
+    db.commit()
+    redis.incr(idx.ZONE_VERSION_KEY)
+    assert idx.get_safety_status(*point, db) == ("You are in a safe area", "info")
+
+
+def test_own_changes_do_not_force_a_rebuild(idx, redis, db, client):
+    idx.get_safety_status(0.0, 0.0, db)
+    built_at = idx.zone_index._built_at
+    res = client.delete("/api/admin/safe-zones/999999999")
+    assert res.status_code == 200
+    zone = zone_at(db, -12.5, 130.5)
+    client.delete(f"/api/admin/safe-zones/{zone.id}")
+    assert redis.get(idx.ZONE_VERSION_KEY) == "1"
+    idx.get_safety_status(0.0, 0.0, db)
+    assert idx.zone_index._built_at == built_at
+
+
+def test_without_redis_the_ttl_still_applies(idx, db, monkeypatch):
+    monkeypatch.setattr(idx, "redis_call", lambda fn, op=None: None)
+    idx.zone_index.invalidate()
+    idx.get_safety_status(0.0, 0.0, db)
+    built_at = idx.zone_index._built_at
+    idx.get_safety_status(0.0, 0.0, db)
+    assert idx.zone_index._built_at == built_at